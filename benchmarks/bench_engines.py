@@ -0,0 +1,32 @@
+"""
+Benchmark the CSV engines of nead.read().
+
+Usage:
+    python benchmarks/bench_engines.py --rows 1e6 1e7
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+
+import nead
+from bench_read import make_file, best_of
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e6])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    engines = [e for e in nead.ENGINES
+               if e == 'c' or importlib.util.find_spec(e) is not None]
+    print(f"{'rows':>12} {'MB':>9} " + ' '.join(f"{e + ' [s]':>12}" for e in engines))
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows]:
+            path = os.path.join(tmp, f'bench_{rows}.csv')
+            make_file(path, rows)
+            mb = os.path.getsize(path) / 1e6
+            times = [best_of(lambda p: nead.read(p, index_col=0, MKS=True, engine=e),
+                             path, args.repeat) for e in engines]
+            print(f"{rows:>12d} {mb:>9.1f} " + ' '.join(f"{t:>12.3f}" for t in times))
+            os.remove(path)
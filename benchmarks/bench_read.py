@@ -0,0 +1,92 @@
+"""
+Benchmark nead.read() against the previous two-pass reader.
+
+Only the header walk and CSV parse are timed; the xarray construction that
+follows is identical for both. The previous reader walked the header with
+one open() and then handed the path to pd.read_csv(comment="#"), which
+re-read the file from byte 0 and checked every data line for the comment
+character. nead.read() now starts the CSV engine at the data offset
+recorded while parsing the header.
+
+Usage:
+    python benchmarks/bench_read.py --rows 1e6 1e7 1e8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import nead
+
+HEADER = """# NEAD 1.0 UTF-8
+# [METADATA]
+# station_id = bench
+# nodata     = -999
+# field_delimiter = ,
+# [FIELDS]
+# fields       = timestamp,TA,RH,VW,ISWR
+# add_value    = 0,273.15,0,0,0
+# scale_factor = 1,1,0.01,1,1
+# [DATA]
+"""
+
+def make_file(path, rows, chunk=1_000_000):
+    """Write a synthetic NEAD file with `rows` hourly rows"""
+    with open(path, 'w') as f:
+        f.write(HEADER)
+        t0 = np.datetime64('2000-01-01T00:00:00')
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            df = pd.DataFrame({
+                'timestamp': t0 + np.arange(start, start + n).astype('timedelta64[h]'),
+                'TA': np.random.uniform(-30, 10, n),
+                'RH': np.random.uniform(20, 100, n),
+                'VW': np.random.uniform(0, 20, n),
+                'ISWR': np.random.uniform(0, 800, n)})
+            df.to_csv(f, index=False, header=False, float_format='%.2f',
+                      date_format='%Y-%m-%dT%H:%M:%S', lineterminator='\n')
+
+def read_two_pass(path):
+    """The pre-offset reader: parse the header, then re-read from byte 0"""
+    with open(path) as f:
+        while f.readline() != "# [DATA]\n":
+            pass
+    return pd.read_csv(path, comment="#", sep=",",
+                       names=['timestamp','TA','RH','VW','ISWR'],
+                       usecols=np.arange(5), skip_blank_lines=True)
+
+def read_single_pass(path):
+    """The current reader: start the CSV engine at the recorded data offset"""
+    with open(path, 'rb') as f:
+        nead.nead._parse_header(f)
+        return pd.read_csv(f, sep=",",
+                           names=['timestamp','TA','RH','VW','ISWR'],
+                           usecols=np.arange(5), skip_blank_lines=True)
+
+def best_of(func, path, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(path)
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e6])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'MB':>9} {'two-pass [s]':>13} {'offset [s]':>11} {'saved':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows]:
+            path = os.path.join(tmp, f'bench_{rows}.csv')
+            make_file(path, rows)
+            mb = os.path.getsize(path) / 1e6
+            old = best_of(read_two_pass, path, args.repeat)
+            new = best_of(read_single_pass, path, args.repeat)
+            print(f"{rows:>12d} {mb:>9.1f} {old:>13.3f} {new:>11.3f} {(old-new)/old:>7.1%}")
+            os.remove(path)
@@ -0,0 +1,159 @@
+"""
+Benchmark nead.read() and nead.write() over synthetic files.
+
+Every combination of --rows, --fields, --nodata and --delimiter is written
+once with generate.py, then each mode is timed in a fresh process so that
+its peak RSS is its own. Results are printed and, with --output, saved as
+JSON together with the commit and library versions. --compare prints the
+change against an earlier report.
+
+Modes:
+    write         nead.write() of an in-memory DataFrame (built untimed)
+    read-<engine> nead.read(index_col=0, MKS=True, engine=<engine>)
+    read-compact  nead.read(index_col=0, dtype='compact')
+    iter_chunks   consume nead.iter_chunks(index_col=0)
+    read-lazy     nead.read(index_col=0, chunks='64MB').compute()
+
+Usage:
+    python benchmarks/bench_suite.py --rows 1e5 1e6 --fields 5 50 --output HEAD.json
+    python benchmarks/bench_suite.py --rows 1e5 1e6 --fields 5 50 --compare HEAD.json
+"""
+import argparse
+import datetime
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate
+import nead
+
+def available_modes():
+    modes = ['write'] + ['read-' + e for e in nead.ENGINES
+                         if e == 'c' or importlib.util.find_spec(e) is not None]
+    modes += ['read-compact', 'iter_chunks']
+    if importlib.util.find_spec('dask') is not None: modes.append('read-lazy')
+    return modes
+
+def _run(mode, path, case, repeat):
+    """Time `mode` on `path`; returns (best seconds, peak RSS in MB)"""
+    if mode == 'write':
+        df = generate.make_frame(0, case['rows'], case['fields'], case['nodata'])
+        conf = generate.make_header(case['fields'], case['delimiter'])
+        out = path + '.out'
+        func = lambda: nead.write(df, conf, out)
+    elif mode.startswith('read-') and mode[5:] in nead.ENGINES:
+        func = lambda: nead.read(path, index_col=0, MKS=True, engine=mode[5:])
+    elif mode == 'read-compact':
+        func = lambda: nead.read(path, index_col=0, dtype='compact')
+    elif mode == 'iter_chunks':
+        func = lambda: sum(ds.sizes['timestamp'] for ds in nead.iter_chunks(path, index_col=0))
+    elif mode == 'read-lazy':
+        func = lambda: nead.read(path, index_col=0, chunks='64MB').compute()
+    else:
+        raise ValueError('Unknown mode: ' + mode)
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    if mode == 'write': os.remove(out)
+    # ru_maxrss is in kB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+    return min(times), rss
+
+def _child(queue, *args):
+    queue.put(_run(*args))
+
+def measure(mode, path, case, repeat):
+    """Run one mode in a fresh interpreter and return its result record"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(queue, mode, path, case, repeat))
+    proc.start()
+    seconds, rss = queue.get()
+    proc.join()
+    size = os.path.getsize(path)
+    return dict(case, mode=mode, bytes=size, seconds=seconds,
+                mb_per_s=size / 1e6 / seconds, peak_rss_mb=rss)
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(['git'] + list(args), capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except OSError:
+            return ''
+    versions = {}
+    for mod in ['numpy', 'pandas', 'xarray', 'pyarrow', 'polars', 'dask']:
+        if importlib.util.find_spec(mod) is not None:
+            versions[mod] = __import__(mod).__version__
+    return {'commit': git('rev-parse', 'HEAD'),
+            'dirty': git('status', '--porcelain', '--untracked-files=no') != '',
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'versions': versions}
+
+def _key(r):
+    return (r['mode'], r['rows'], r['fields'], r['nodata'], r['delimiter'])
+
+def print_results(results, base=None):
+    base = {_key(r): r for r in (base or [])}
+    head = (f"{'mode':<13} {'rows':>10} {'fields':>6} {'nodata':>6} {'sep':>3} "
+            f"{'MB':>8} {'time [s]':>9} {'MB/s':>8} {'RSS [MB]':>9}")
+    if base: head += f" {'base [s]':>9} {'speedup':>8}"
+    print(head)
+    for r in results:
+        line = (f"{r['mode']:<13} {r['rows']:>10d} {r['fields']:>6d} {r['nodata']:>6.2f} "
+                f"{r['delimiter']:>3} {r['bytes'] / 1e6:>8.1f} {r['seconds']:>9.3f} "
+                f"{r['mb_per_s']:>8.1f} {r['peak_rss_mb']:>9.0f}")
+        if base:
+            b = base.get(_key(r))
+            line += (f" {b['seconds']:>9.3f} {b['seconds'] / r['seconds']:>7.2f}x" if b
+                     else f" {'-':>9} {'-':>8}")
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e5])
+    parser.add_argument('--fields', type=int, nargs='+', default=[5])
+    parser.add_argument('--nodata', type=float, nargs='+', default=[0.0])
+    parser.add_argument('--delimiter', nargs='+', default=[','])
+    parser.add_argument('--modes', nargs='+', default=None,
+                        help='default: ' + ' '.join(available_modes()))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='save the report as JSON')
+    parser.add_argument('--compare', help='JSON report to compare against')
+    args = parser.parse_args()
+
+    modes = args.modes or available_modes()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows, fields, nodata, delimiter in itertools.product(
+                [int(r) for r in args.rows], args.fields, args.nodata, args.delimiter):
+            case = dict(rows=rows, fields=fields, nodata=nodata, delimiter=delimiter)
+            path = os.path.join(tmp, 'bench.csv')
+            generate.make_nead(path, rows, fields, nodata, delimiter)
+            for mode in modes:
+                results.append(measure(mode, path, case, args.repeat))
+            os.remove(path)
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['results']
+    print_results(results, base)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=1)
@@ -0,0 +1,76 @@
+"""
+Write synthetic NEAD files for benchmarking.
+
+The header is built with nead.build_header_obj() and the rows are streamed
+through nead.write(), so files of 10^8 rows never sit in memory at once.
+Fields after the timestamp alternate between floats and integers.
+
+Usage:
+    python benchmarks/generate.py out.csv --rows 1e6 --fields 20 --nodata 0.05 --delimiter ';'
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import nead
+
+NODATA = -999
+
+def field_names(fields):
+    """timestamp followed by fields - 1 numbered measurement names"""
+    return ['timestamp'] + ['F%03d' % i for i in range(1, fields)]
+
+def make_frame(start, rows, fields, nodata=0.0, rng=None):
+    """Hourly rows [start, start + rows) with a fraction `nodata` of missing values"""
+    rng = np.random.default_rng(start) if rng is None else rng
+    t0 = np.datetime64('2000-01-01T00:00:00')
+    data = {'timestamp': (t0 + np.arange(start, start + rows).astype('timedelta64[h]'))
+            .astype(str)}
+    for i, name in enumerate(field_names(fields)[1:]):
+        if i % 2:
+            col = rng.integers(0, 1000, rows)
+        else:
+            col = np.round(rng.uniform(-50, 50, rows), 2)
+        if nodata > 0:
+            col[rng.random(rows) < nodata] = NODATA
+        data[name] = col
+    return pd.DataFrame(data)
+
+def make_header(fields, delimiter=','):
+    """Header object for `fields` columns, from nead.build_header_obj()"""
+    sample = make_frame(0, 1, fields)
+    conf = nead.build_header_obj(sample,
+                                 metadata = {'station_id': 'bench',
+                                             'nodata': NODATA,
+                                             'timezone': 0,
+                                             'field_delimiter': delimiter},
+                                 units = ['time'] + ['1'] * (fields - 1))
+    # build_header_obj joins with ','; [FIELDS] lists use the field delimiter
+    for key, val in conf.items('FIELDS'):
+        conf['FIELDS'][key] = val.replace(',', delimiter)
+    return conf
+
+def make_nead(path, rows, fields=5, nodata=0.0, delimiter=',', seed=0, chunk=1_000_000):
+    """Write a synthetic NEAD file and return its size in bytes"""
+    rng = np.random.default_rng(seed)
+    frames = (make_frame(start, min(chunk, rows - start), fields, nodata, rng)
+              for start in range(0, rows, chunk))
+    nead.write(frames, make_header(fields, delimiter), path)
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        return f.tell()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=float, default=1e6)
+    parser.add_argument('--fields', type=int, default=5)
+    parser.add_argument('--nodata', type=float, default=0.0,
+                        help='fraction of values set to nodata')
+    parser.add_argument('--delimiter', default=',')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    size = make_nead(args.path, int(args.rows), args.fields, args.nodata,
+                     args.delimiter, args.seed)
+    print(f"{args.path}: {size / 1e6:.1f} MB")
@@ -0,0 +1,257 @@
+"""
+Command line interface: nead convert, nead info and nead validate
+"""
+import argparse
+import configparser
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import nead
+
+SUFFIXES = {'nead': '.csv',
+            'nead-binary': '.nead',
+            'parquet': '.parquet',
+            'feather': '.feather',
+            'netcdf': '.nc'}
+
+MANIFEST = '.nead-convert.json'
+
+COMPRESSED = {'gzip': '.gz', 'bz2': '.bz2', 'zstd': '.zst'}
+
+_MAGIC = (b'# NEAD', b'PAR1', b'ARROW1', b'CDF', b'\x89HDF')
+
+def _looks_like_nead(path):
+    """True for NEAD text and the binary formats written by `nead.write`"""
+    if not os.path.isfile(path) or path.endswith('.idx'): return False
+    with nead._open(path) as f:
+        return f.read(8).startswith(_MAGIC)
+
+def expand(inputs, pattern='*'):
+    """Files named by `inputs`: paths, globs, or directories searched with `pattern`"""
+    paths = []
+    for i in inputs:
+        if os.path.isdir(i):
+            paths += [p for p in sorted(glob.glob(os.path.join(i, pattern))) if _looks_like_nead(p)]
+        elif glob.has_magic(i):
+            paths += [p for p in sorted(glob.glob(i)) if os.path.isfile(p)]
+        else:
+            paths.append(i)
+    return list(dict.fromkeys(paths))
+
+def _header_conf(hdr):
+    """A header ConfigParser, as taken by `nead.write`, from a NeadHeader"""
+    conf = configparser.ConfigParser(interpolation=None)
+    conf['METADATA'] = {k: str(v) for k,v in hdr.meta.items()}
+    conf['FIELDS'] = dict({'fields': hdr.delimiter.join(hdr.names)},
+                          **{k: str(v) for k,v in hdr.fields.items()})
+    conf['DATA'] = {}
+    return conf
+
+def count_rows(path):
+    """Number of data rows, without parsing the data where the format allows"""
+    fmt = nead._file_format(path)
+    if fmt in ['nead', 'nead-binary']:
+        with nead._open(path) as f:
+            hdr = nead._parse_header(f)
+            if fmt == 'nead-binary': return int(hdr.meta['row_count'])
+            return sum(r[2] for r in nead._block_ranges(f, hdr.data_offset, 2**24))
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    arrays = nead.read(path, output='numpy')
+    return len(next(iter(arrays.values()))) if arrays else 0
+
+def info(path):
+    """Header summary and row count of one file, as a dictionary"""
+    hdr = nead._header_of(path)
+    return {'path': path,
+            'format': nead._file_format(path),
+            'bytes': os.path.getsize(path),
+            'rows': count_rows(path),
+            'station_id': hdr.meta.get('station_id'),
+            'fields': hdr.names}
+
+def convert(src, dst, format, compression=None):
+    """Convert one file; returns (rows, bytes read)
+
+    The output is written next to `dst` and renamed into place, so an
+    interrupted run never leaves a partial file under the final name.
+    """
+    hdr = nead._header_of(src)
+    df = nead.read(src, output='pandas').reset_index(drop=True)
+    df.attrs = {} # the header is written from `hdr`
+    nodata = hdr.meta.get('nodata')
+    if format == 'nead':
+        if isinstance(nodata, (int, float)) and not isinstance(nodata, bool):
+            df = df.fillna(nodata)
+        for c in df.columns:
+            if df[c].dtype.kind == 'M': # ISO 8601, as NEAD text files write them
+                df[c] = np.datetime_as_string(df[c].values, unit='s')
+    tmp = dst + '.tmp'
+    try:
+        nead.write(df, _header_conf(hdr), tmp, format=format, float_format=None,
+                   compression=compression)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    return len(df), os.path.getsize(src)
+
+def _stamp(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _load_manifest(outdir):
+    try:
+        with open(os.path.join(outdir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(outdir, manifest):
+    path = os.path.join(outdir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def _run(func, jobs, items):
+    """Yield (item, result, error) for func(*item), in a process pool if jobs > 1"""
+    if jobs == 1 or len(items) < 2:
+        for item in items:
+            try:
+                yield item, func(*item), None
+            except Exception as e:
+                yield item, None, e
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(func, *item): item for item in items}
+        for fut in as_completed(futures):
+            e = fut.exception()
+            yield futures[fut], (None if e else fut.result()), e
+
+def _error(e):
+    return str(e) or type(e).__name__
+
+def _throughput(rows, nbytes, seconds):
+    seconds = max(seconds, 1e-9)
+    return ('%d rows, %.1f MB in %.2f s: %.0f rows/s, %.1f MB/s'
+            % (rows, nbytes / 1e6, seconds, rows / seconds, nbytes / 1e6 / seconds))
+
+def cmd_convert(args):
+    os.makedirs(args.output, exist_ok=True)
+    manifest = {} if args.force else _load_manifest(args.output)
+    todo, skipped = [], 0
+    for src in expand(args.inputs, args.pattern):
+        stem = os.path.basename(src)
+        if nead._output_format(stem)[1] is not None: stem = os.path.splitext(stem)[0]
+        stem = os.path.splitext(stem)[0]
+        dst = os.path.join(args.output, stem + SUFFIXES[args.to]
+                           + COMPRESSED.get(args.compress, ''))
+        assert(os.path.abspath(dst) != os.path.abspath(src)), print('Output would overwrite ', src)
+        entry = manifest.get(os.path.abspath(src))
+        if (entry is not None and entry.get('output') == os.path.abspath(dst)
+                and os.path.exists(dst) and entry.get('input') == _stamp(src)):
+            skipped += 1
+            continue
+        todo.append((src, dst, args.to, args.compress))
+
+    start = time.perf_counter()
+    rows = nbytes = failed = 0
+    try:
+        for (src, dst, _, _), result, e in _run(convert, args.jobs, todo):
+            if e is not None:
+                failed += 1
+                print('FAIL %s: %s' % (src, _error(e)), file=sys.stderr)
+                continue
+            rows += result[0]
+            nbytes += result[1]
+            manifest[os.path.abspath(src)] = {'input': _stamp(src),
+                                              'output': os.path.abspath(dst)}
+            if args.verbose: print('%s -> %s' % (src, dst))
+    finally:
+        _save_manifest(args.output, manifest)
+    print('converted %d, skipped %d (up to date), failed %d: %s'
+          % (len(todo) - failed, skipped, failed,
+             _throughput(rows, nbytes, time.perf_counter() - start)))
+    return 1 if failed else 0
+
+def cmd_info(args):
+    failed = 0
+    for path in expand(args.inputs, args.pattern):
+        try:
+            i = info(path)
+        except Exception as e:
+            failed += 1
+            print('FAIL %s: %s' % (path, _error(e)), file=sys.stderr)
+            continue
+        if args.json:
+            print(json.dumps(i))
+        else:
+            print('%s: %s, %.1f MB, %d rows, station %s, %d fields: %s'
+                  % (i['path'], i['format'], i['bytes'] / 1e6, i['rows'], i['station_id'],
+                     len(i['fields']), ', '.join(i['fields'])))
+    return 1 if failed else 0
+
+def cmd_validate(args):
+    paths = expand(args.inputs, args.pattern)
+    start = time.perf_counter()
+    invalid = 0
+    for (path,), problems, e in _run(nead.validate, args.jobs, [(p,) for p in paths]):
+        if e is not None: problems = [_error(e)]
+        if problems:
+            invalid += 1
+            for p in problems: print('%s: %s' % (path, p))
+        elif args.verbose:
+            print('%s: OK' % path)
+    nbytes = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+    print('%d files, %d invalid, %.1f MB in %.2f s'
+          % (len(paths), invalid, nbytes / 1e6, time.perf_counter() - start))
+    return 1 if invalid else 0
+
+def parser():
+    p = argparse.ArgumentParser(prog='nead', description='Convert, inspect and validate NEAD files')
+    sub = p.add_subparsers(dest='command')
+    sub.required = True
+
+    def common(s, jobs=True):
+        s.add_argument('inputs', nargs='+', help='files, globs or directories')
+        s.add_argument('--pattern', default='*', help='file pattern inside directories')
+        if jobs:
+            s.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                           help='processes (default: number of CPUs)')
+        s.add_argument('-v', '--verbose', action='store_true')
+
+    s = sub.add_parser('convert', help='convert between NEAD text and binary formats')
+    common(s)
+    s.add_argument('-o', '--output', required=True, help='output directory')
+    s.add_argument('-t', '--to', choices=list(SUFFIXES.keys()), default='parquet')
+    s.add_argument('-z', '--compress', choices=list(COMPRESSED.keys()),
+                   help='compress NEAD text output')
+    s.add_argument('--force', action='store_true', help='convert even if up to date')
+    s.set_defaults(func=cmd_convert)
+
+    s = sub.add_parser('info', help='print header summaries and row counts')
+    common(s, jobs=False)
+    s.add_argument('--json', action='store_true', help='one JSON object per file')
+    s.set_defaults(func=cmd_info)
+
+    s = sub.add_parser('validate', help='check files against their headers, then read them')
+    common(s)
+    s.set_defaults(func=cmd_validate)
+    return p
+
+def main(argv=None):
+    p = parser()
+    args = p.parse_args(argv)
+    if getattr(args, 'compress', None) and args.to != 'nead':
+        p.error('--compress requires --to nead')
+    if getattr(args, 'jobs', 1) < 1: args.jobs = 1
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
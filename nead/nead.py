@@ -4,126 +4,2274 @@ A Python module for reading and writing NEAD files
 import numpy as np
 import pandas as pd
 import xarray as xr
-from io import StringIO
+from io import BytesIO
 import configparser
 from pathlib import Path
 xr.set_options(keep_attrs=True)
-import codecs
+import json
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import glob
+import re
+import contextlib
+import logging
+import asyncio
+import time
+import tracemalloc
+import io
+import gzip
+import bz2
+import struct
 
-def read(neadfile, MKS=None, multi_index=True, index_col=None):
+def _typed_values(arr):
+    """Type a list of header strings as a whole
+
+    RETURNS
+    -------
+    An int array if every entry is an integer, a float array if every entry
+    is numeric (empty entries become nan), otherwise a list of strings.
+    """
+    strs = np.asarray(arr, dtype=str)
+    num = np.asarray(pd.to_numeric(strs, errors='coerce'), dtype=float)
+    missing = np.isin(np.char.lower(strs), ['', 'nan'])
+    if np.any(np.isnan(num) & ~missing):
+        return [str(s) for s in arr]
+    if np.all(np.isfinite(num)) and np.all(num == np.round(num)):
+        return num.astype(int)
+    return num
+
+def _typed_value(val):
+    """Type a single header value as int, float or str"""
+    if val == '': return val
+    v = _typed_values([val])
+    return v[0] if isinstance(v, list) else v[0].item()
+
+class NeadHeader:
+    """A parsed NEAD header
+
+    ATTRIBUTES
+    ----------
+    meta: dict
+        [METADATA] keys and typed values
+    fields: dict
+        [FIELDS] keys and their unsplit values, except 'fields'
+    names: list
+        Field names
+    delimiter: string
+        Field delimiter
+    data_offset: integer
+        Byte offset of the first data line
+
+    The per-field arrays returned by `field_attrs` are split and typed once,
+    then cached on the object.
+    """
+    def __init__(self, meta, fields, data_offset):
+        self.meta = meta
+        self.fields = dict(fields)
+        self.delimiter, self.names = _field_names(meta, self.fields)
+        self.data_offset = data_offset
+        self._typed = {}
+
+    def field_attrs(self, usecols=None):
+        """Per-field properties for the fields in `usecols` (default all)
+
+        RETURNS
+        -------
+        A dictionary mapping each [FIELDS] key to an array with one entry per
+        selected field.
+        """
+        if len(self._typed) != len(self.fields):
+            self._typed = _field_attrs(self.fields, self.delimiter, self.names)
+        if usecols is None: return dict(self._typed)
+        return {key: (arr[usecols] if isinstance(arr, np.ndarray) else [arr[i] for i in usecols])
+                for key, arr in self._typed.items()}
+
+class HeaderCache:
+    """LRU cache of parsed NEAD headers
+
+    Entries are keyed by (path, inode, header length, header hash), so a
+    header is parsed once per file version. Appending rows to a file does not
+    change its key. Use the module-level `header_cache` instance.
+
+    ATTRIBUTES
+    ----------
+    maxsize: integer
+        Maximum number of headers kept. 0 disables caching.
+    hits, misses: integer
+        Lookup counters, reset by `clear`.
+    """
+    def __init__(self, maxsize=256):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, n):
+        with self._lock:
+            self._maxsize = n
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > max(self._maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached header for `key`, or None"""
+        with self._lock:
+            hdr = self._entries.get(key)
+            if hdr is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hdr
+
+    def put(self, key, hdr):
+        with self._lock:
+            self._entries[key] = hdr
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+header_cache = HeaderCache()
+
+class Profile:
+    """Per-stage measurements collected by `profile`
+
+    ATTRIBUTES
+    ----------
+    stages: list of dict
+        One record per stage run, in order, with keys 'stage', 'file',
+        'seconds', 'rows', 'bytes' and, if memory is traced, 'memory' (peak
+        bytes allocated during the stage). rows and bytes are None where a
+        stage does not handle rows or file bytes.
+    """
+    def __init__(self, memory=False, logger=None, level=logging.INFO):
+        self.memory = memory
+        self.logger = logger
+        self.level = level
+        self.stages = []
+
+    def _record(self, rec):
+        self.stages.append(rec)
+        if self.logger is not None:
+            self.logger.log(self.level, json.dumps(rec), extra={'nead': rec})
+
+    def totals(self):
+        """Per stage: total seconds, rows and bytes, peak memory, as a DataFrame"""
+        df = pd.DataFrame(self.stages)
+        if df.empty: return df
+        total = lambda x: x.sum(min_count=1)
+        how = {'seconds': total, 'rows': total, 'bytes': total, 'memory': 'max'}
+        return df.groupby('stage', sort=False).agg({k: v for k,v in how.items() if k in df})
+
+    def __str__(self):
+        return self.totals().to_string()
+
+_profiles = threading.local()
+
+@contextlib.contextmanager
+def profile(memory=False, logger=None, level=logging.INFO):
+    """Measure each stage of `read`, `iter_chunks` and `write`
+
+    Stages run in this thread while the context is open are recorded:
+    header, parse, times, mask_and_scale, build and select_time when
+    reading; write_header, write_rows and write_binary when
+    writing. Outside of a `profile` context nothing is measured.
+
+    KEYWORDS
+    --------
+    memory: bool
+        Trace allocations with tracemalloc and record the peak per stage.
+        Slows the traced code down.
+    logger: logging.Logger
+        Also log each record, as a JSON message, with the record in the
+        `nead` attribute of the log record.
+    level: integer
+        Log level of the records
+
+    RETURNS
+    -------
+    A Profile, filled in as stages complete.
+
+    EXAMPLE
+    -------
+    with nead.profile() as p:
+        ds = nead.read('sample.csv', index_col=0)
+    print(p)
+    """
+    p = Profile(memory, logger, level)
+    stack = _profiles.__dict__.setdefault('stack', [])
+    started = memory and not tracemalloc.is_tracing()
+    if started: tracemalloc.start()
+    stack.append(p)
+    try:
+        yield p
+    finally:
+        stack.remove(p)
+        if started: tracemalloc.stop()
+
+class _Stage:
+    """Times one stage for every open Profile of this thread"""
+    def __init__(self, profiles, name, path):
+        self.profiles = profiles
+        self.memory = any(p.memory for p in profiles) and tracemalloc.is_tracing()
+        self.rec = {'stage': name, 'file': None if path is None else str(path),
+                    'seconds': None, 'rows': None, 'bytes': None}
+
+    def set(self, rows=None, nbytes=None):
+        if rows is not None: self.rec['rows'] = int(rows)
+        if nbytes is not None: self.rec['bytes'] = int(nbytes)
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.rec['seconds'] = time.perf_counter() - self.start
+        if self.memory:
+            self.rec['memory'] = tracemalloc.get_traced_memory()[1] - self.start_memory
+        for p in self.profiles:
+            p._record(dict(self.rec))
+        return False
+
+class _NoStage:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, rows=None, nbytes=None): pass
+
+_NO_STAGE = _NoStage()
+
+def _stage(name, path=None):
+    """Context manager measuring stage `name`; a shared no-op unless profiling"""
+    stack = getattr(_profiles, 'stack', None)
+    if not stack: return _NO_STAGE
+    return _Stage(list(stack), name, path)
+
+def _read_header_bytes(f):
+    """Read the raw header bytes, leaving `f` at the first data line
+
+    Stops after "# [DATA]" and any empty "# " lines that follow it, without
+    parsing any keys or values. Blank lines inside the header are kept.
+    """
+    lines = [f.readline()]
+    while lines[-1].startswith(b'#') or lines[-1].strip() == b'':
+        line = f.readline()
+        assert(line != b''), print('Error reading NEAD file: no [DATA] section')
+        lines.append(line)
+        if line.rstrip(b'\r\n') == b'# [DATA]': break
+
+    # Writers may leave empty "# " lines after "# [DATA]". Skip them so the
+    # offset points at the first real data line.
+    pos = f.tell()
+    line = f.readline()
+    while line.startswith(b'#') and line.strip(b'# \r\n') == b'':
+        lines.append(line)
+        pos = f.tell()
+        line = f.readline()
+    f.seek(pos)
+    return b''.join(lines)
+
+def _parse_header(f):
+    """Parse the NEAD header from a file opened in binary mode
+
+    Headers are looked up in `header_cache` first.
+
+    PARAMETERS
+    ----------
+    f: file object
+        Binary file handle positioned at the start of a NEAD file
+
+    RETURNS
+    -------
+    A NeadHeader. Its data_offset is the byte offset of the first line after
+    "# [DATA]". On return ``f`` is positioned at that offset.
+    """
+    start = f.tell()
+    raw = _read_header_bytes(f)
+    try:
+        path, inode = os.path.realpath(f.name), os.fstat(f.fileno()).st_ino
+    except (AttributeError, TypeError, OSError, ValueError):
+        path, inode = None, None
+    key = (path, inode, len(raw), hashlib.blake2b(raw, digest_size=16).digest())
+    hdr = header_cache.get(key)
+    if hdr is None:
+        hdr = _parse_header_bytes(raw, start)
+        if header_cache.maxsize > 0: header_cache.put(key, hdr)
+    return hdr
+
+def _parse_header_bytes(raw, start=0):
+    """Parse raw header bytes into a NeadHeader
+
+    `start` is the file offset of the header, so that data_offset is
+    start + len(raw).
+    """
+    f = BytesIO(raw)
+    fmt = f.readline().decode('utf-8')
+    assert(fmt[0] == "#")
+    assert(fmt.split("#")[1].split()[0] == "NEAD")
+    assert(fmt.split("#")[1].split()[1] == "1.0")
+    assert(fmt.split("#")[1].split()[2] == "UTF-8")
+
+    line = f.readline().decode('utf-8')
+    assert(line[0] == "#")
+    assert(line.split("#")[1].strip() == '[METADATA]')
+
+    meta = {}
+    fields = {}
+    section = 'meta'
+    while True:
+        line = f.readline().decode('utf-8')
+        assert(line != ''), print('Error reading NEAD file: no [DATA] section')
+        line = line.replace('\r\n', '\n')
+        if not line.endswith('\n'): line += '\n'
+
+        if line.strip(' ') == '#': continue
+        if line == "# [DATA]\n": break # done reading header
+        if line == "# [FIELDS]\n":
+            section = 'fields'
+            continue # done reading header
+
+        if line[0] == "\n": continue   # blank line
+        assert(line[0] == "#")         # if not blank, must start with "#"
+
+        key_eq_val = line.split("#")[1].strip()
+        if key_eq_val == '' or key_eq_val == None: continue  # Line is just "#" or "# " or "#   #"...
+        assert("=" in key_eq_val), print(line, key_eq_val)
+        key = key_eq_val.split("=")[0].strip()
+        val = key_eq_val.split("=")[1].strip()
+
+        # Convert from string to number if it is a number. Per-field lists
+        # are typed as a whole by NeadHeader.field_attrs.
+        if section == 'meta': meta[key] = _typed_value(val)
+        if section == 'fields': fields[key] = val
+    # done reading header
+    return NeadHeader(meta, fields, start + len(raw))
+
+def _field_names(meta, fields):
+    """Return the field delimiter and field names, removing 'fields' from `fields`"""
+    # Find delimiter and fields for reading NEAD as simple CSV
+    assert("field_delimiter" in meta.keys())
+    assert("fields" in fields.keys())
+    FD = meta["field_delimiter"]
+    names = [_.strip() for _ in fields.pop('fields').split(FD)]
+    return FD, names
+
+def _usecols(names, variables=None, index_col=None):
+    """Return the column indices to parse for the requested variables
+
+    The index column is always kept. Indices are returned in file order.
+    """
+    if variables is None: return list(range(len(names)))
+    if isinstance(variables, str): variables = [variables]
+    for v in variables:
+        assert(v in names), print('Error reading NEAD file: ', v, ' not in fields ', names)
+    usecols = [i for i,n in enumerate(names) if n in variables]
+    if index_col != None and index_col not in usecols:
+        usecols = sorted(usecols + [index_col])
+    return usecols
+
+ENGINES = ['c', 'pyarrow', 'polars']
+
+def _nodata_strings(nodata):
+    """Text forms of the nodata sentinel for engines that match nulls as strings"""
+    if isinstance(nodata, bool) or not isinstance(nodata, (int, float, np.number)):
+        return []
+    if np.isnan(nodata): return []
+    out = [str(nodata), '%g' % nodata]
+    if nodata == int(nodata): out += [str(int(nodata)), str(int(nodata)) + '.', '%.1f' % nodata]
+    return list(dict.fromkeys(out))
+
+def _first_line(f):
+    """The first non-blank line from the position of `f`, or b'' at the end
+
+    Restores the position of `f`.
+    """
+    pos = f.tell()
+    line = f.readline()
+    while line != b'' and line.strip() == b'':
+        line = f.readline()
+    f.seek(pos)
+    return line
+
+def _empty_frame(names, usecols):
+    """The columns without rows, as returned for an empty data section"""
+    return pd.DataFrame({names[i]: np.array([], dtype=object) for i in usecols})
+
+def _string_columns(f, names, FD, usecols):
+    """Names of the selected fields whose first value is not a number
+
+    Peeks at the first data line and restores the position of `f`.
+    """
+    vals = _first_line(f).decode('utf-8').rstrip('\r\n').split(FD)
+    out = []
+    for i in usecols:
+        try:
+            float(vals[i])
+        except (ValueError, IndexError):
+            out.append(names[i])
+    return out
+
+def _time_format(f, FD, index_col):
+    """strftime format of the index column, guessed from the first data line
+
+    Returns None if the value does not look like a timestamp; the column is
+    then parsed as ISO 8601. Restores the position of `f`.
+    """
+    from pandas.tseries.api import guess_datetime_format
+    vals = _first_line(f).decode('utf-8').rstrip('\r\n').split(FD)
+    if index_col >= len(vals): return None
+    return guess_datetime_format(vals[index_col].strip())
+
+def _parse_times(values, fmt=None):
+    """Parse timestamps to naive datetime64[ns], in one vectorized pass
+
+    Repeated strings are converted once (pandas' datetime cache). Values
+    carrying a UTC offset are converted to UTC.
+    """
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]', copy=False)
+    if len(values) == 0:
+        return np.array([], dtype='datetime64[ns]')
+    try:
+        t = pd.to_datetime(values, format=fmt or 'ISO8601', cache=True)
+    except (ValueError, TypeError):
+        t = pd.to_datetime(values, format='mixed', cache=True)
+    t = pd.DatetimeIndex(t)
+    if t.tz is not None: t = t.tz_convert('UTC').tz_localize(None)
+    return t.values.astype('datetime64[ns]')
+
+def _utc_offset(timezone):
+    """The header `timezone` as a numpy timedelta
+
+    Accepts hours (1, -5.5, '+01') and strings such as '+01:00', 'UTC' or
+    'GMT+1'.
+    """
+    if isinstance(timezone, (int, float, np.number)) and not isinstance(timezone, bool):
+        return np.timedelta64(int(round(timezone * 3600)), 's')
+    m = re.fullmatch(r'(?:UTC|GMT|Z)?\s*(?:([+-])\s*(\d{1,2})(?::?(\d{2}))?)?',
+                     str(timezone).strip(), re.IGNORECASE)
+    assert(m is not None and str(timezone).strip() != ''), print('Unknown timezone: ', timezone)
+    sign = -1 if m.group(1) == '-' else 1
+    seconds = int(m.group(2) or 0) * 3600 + int(m.group(3) or 0) * 60
+    return np.timedelta64(sign * seconds, 's')
+
+def _read_csv(f, names, FD, usecols, engine='c', nodata=None, times=None, **kwargs):
+    """Parse (part of) the data section with the CSV engine
+
+    engine: 'c' (pandas), 'pyarrow' or 'polars'. All return the same
+    DataFrame. `nodata` is passed to the engine as a null value where the
+    engine supports it; _to_dataset masks any remaining sentinels.
+    `times` is an optional (field name, strftime format) pair; that column
+    is parsed to timestamps by the engine. If the engine cannot parse it,
+    the column is returned as text and _to_dataset parses it.
+    """
+    assert(engine in ENGINES), print('Unknown engine: ', engine, ENGINES)
+    if engine != 'c':
+        assert(set(kwargs.keys()) <= set(['dtype'])), print(engine, ' engine does not support ', kwargs)
+        return _read_csv_other(f, names, FD, usecols, engine, nodata, kwargs.get('dtype'), times)
+    dtype = kwargs.get('dtype') or {}
+    if times is not None:
+        kwargs['parse_dates'] = [times[0]]
+        kwargs['date_format'] = times[1] or 'ISO8601'
+    sentinels = _nodata_strings(nodata)
+    if sentinels:
+        kwargs['na_values'] = {names[i]: sentinels for i in usecols
+                               if not (names[i] in dtype and np.dtype(dtype[names[i]]).kind in 'iu')}
+    try:
+        return pd.read_csv(f,
+                           names = names,
+                           sep = FD,
+                           usecols = usecols,
+                           skip_blank_lines = True,
+                           **kwargs)
+    except pd.errors.EmptyDataError:
+        # No data lines (yet). Return the columns without rows.
+        return _empty_frame(names, usecols)
+
+def _read_csv_other(f, names, FD, usecols, engine, nodata=None, dtype=None, times=None):
+    """_read_csv for the pyarrow and polars engines"""
+    dtype = dtype or {}
+    cols = [names[i] for i in usecols]
+    if _first_line(f) == b'':
+        # Both engines raise on empty input; match the C engine
+        return _empty_frame(names, usecols)
+    strings = _string_columns(f, names, FD, usecols)
+    if engine == 'pyarrow':
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        convert = pacsv.ConvertOptions()
+        # Keep non-numeric fields as text, as the C engine does, rather than
+        # letting pyarrow infer timestamps
+        types = {n: pa.string() for n in strings}
+        types.update({n: (pa.string() if np.dtype(t) == object else pa.from_numpy_dtype(np.dtype(t)))
+                      for n,t in dtype.items()})
+        def parse(types, parsers):
+            return pacsv.read_csv(f,
+                                  read_options = pacsv.ReadOptions(column_names = names),
+                                  parse_options = pacsv.ParseOptions(delimiter = FD,
+                                                                     ignore_empty_lines = True),
+                                  convert_options = pacsv.ConvertOptions(
+                                      include_columns = cols,
+                                      column_types = types,
+                                      timestamp_parsers = parsers,
+                                      null_values = list(convert.null_values) + _nodata_strings(nodata),
+                                      strings_can_be_null = True))
+        if times is not None:
+            pos = f.tell()
+            try:
+                table = parse(dict(types, **{times[0]: pa.timestamp('ns')}),
+                              [times[1]] if times[1] else None)
+                return _astype(table.to_pandas(), dtype)
+            except pa.ArrowInvalid:
+                f.seek(pos) # not a timestamp pyarrow can parse; keep the text
+        return _astype(parse(types, None).to_pandas(), dtype)
+
+    import polars as pl
+    # Drop blank lines from the text; rows whose selected fields are all
+    # empty or nodata are kept, as with the other engines
+    df = pl.read_csv(re.sub(rb'(?m)^\r?\n', b'', f.read()),
+                     has_header = False,
+                     new_columns = names,
+                     separator = FD,
+                     columns = usecols,
+                     infer_schema = False,
+                     null_values = _nodata_strings(nodata))
+    out = {}
+    for n in cols:
+        s = df[n]
+        if n not in strings:
+            # Numeric text may carry padding; type like the C engine does
+            stripped = s.str.strip_chars()
+            for t in [pl.Int64, pl.Float64]:
+                try:
+                    s = stripped.cast(t)
+                    break
+                except pl.exceptions.InvalidOperationError:
+                    continue
+        if times is not None and n == times[0]:
+            try:
+                s = s.str.strip_chars().str.to_datetime(times[1], time_unit='ns')
+            except pl.exceptions.PolarsError:
+                pass # keep the text; _to_dataset parses it
+        arr = s.to_numpy()
+        out[n] = arr
+    return _astype(pd.DataFrame(out), dtype)
+
+def _astype(df, dtype):
+    """Cast to the requested dtypes; text becomes object as with the C engine"""
+    dtype = {n: t for n,t in dtype.items() if n in df.columns}
+    return df.astype(dtype) if dtype else df
+
+def _field_attrs(fields, FD, names):
+    """Split each per-field property into one typed value per field
+
+    RETURNS
+    -------
+    A dictionary mapping each [FIELDS] key to an array with one entry per field.
+    """
+    attrs = {}
+    for key in fields.keys():
+        val = str(fields[key])
+        assert(len(val.split(FD)) == len(names)), print('Error reading NEAD file: ',
+                                                        key,' has ',
+              len(val.split(FD)),'items for ',len(names),' fields')
+        attrs[key] = _typed_values([_.strip() for _ in val.split(FD)])
+    return attrs
+
+_FLOAT_TYPES = ['float', 'float16', 'float32', 'float64', 'real', 'double',
+                'double precision', 'numeric', 'decimal']
+
+_INT_TYPES = {'int8': np.int8, 'tinyint': np.int8, 'int16': np.int16, 'smallint': np.int16,
+              'int32': np.int32, 'int': np.int32, 'integer': np.int32,
+              'uint8': np.uint8, 'uint16': np.uint16, 'uint32': np.uint32}
+
+def _parser_dtypes(field_attrs, names, usecols, dtype=None, index_col=None):
+    """Per-field dtypes to hand to the CSV parser
+
+    With dtype='compact', fields declared as floats in
+    `database_fields_data_types` are parsed as float32. Integer fields are
+    parsed at their natural width, so that `nodata` and empty values can be
+    masked, and narrowed to their declared width by `_compact`. A dictionary
+    of {field: dtype} is
+    passed through. The index column is never overridden.
+    """
+    if dtype is None: return None
+    if isinstance(dtype, dict):
+        for k in dtype.keys():
+            assert(k in names), print('Unknown field: ', k)
+        return {k: np.dtype(v) for k,v in dtype.items()}
+    assert(dtype == 'compact'), print('Unknown dtype: ', dtype)
+    types = field_attrs.get('database_fields_data_types')
+    if types is None: return None
+    out = {}
+    for j, i in enumerate(usecols):
+        if i == index_col: continue
+        t = str(types[j]).strip().lower()
+        if t in _FLOAT_TYPES: out[names[i]] = np.dtype(np.float32)
+    return out
+
+def _compact(df, dtype=None, types=None):
+    """Cast the columns of `df` to the requested dtypes where the parser did not
+
+    With dtype='compact', remaining float64 columns become float32, and
+    integer columns the width declared in `types` (the
+    `database_fields_data_types` of each column), so that every chunk of a
+    file gets the same dtype. Integer columns that are not declared narrower
+    stay int64, as do values that do not fit the declared width. Integer
+    columns with masked values were parsed as floats and become float32.
+    """
+    if dtype is None: return df
+    for j, c in enumerate(df.columns):
+        kind = df[c].dtype.kind
+        if isinstance(dtype, dict):
+            if c in dtype and df[c].dtype != np.dtype(dtype[c]):
+                df[c] = df[c].astype(dtype[c])
+        elif kind == 'f' and df[c].dtype.itemsize > 4:
+            df[c] = df[c].astype(np.float32)
+        elif kind in 'iu' and types is not None:
+            to = _INT_TYPES.get(str(types[j]).strip().lower())
+            if to is None or len(df) == 0: continue
+            info = np.iinfo(to)
+            if df[c].min() >= info.min and df[c].max() <= info.max:
+                df[c] = df[c].astype(to)
+    return df
+
+def _to_dataset(df, meta, field_attrs, MKS=None, index_col=None, dtype=None,
+                time_format=None, utc=False, path=None, mask=True, output='xarray'):
+    """Build the xarray dataset for a DataFrame parsed from the data section
+
+    Attaches the [METADATA] and per-field attributes, converts to MKS if
+    requested, sets the index column and masks `nodata`. `df` may also be a
+    dataset with an 'index' dimension, e.g. one backed by dask arrays.
+    The index column is parsed with `time_format` unless the CSV engine
+    already did so, and shifted to UTC by the header `timezone` if `utc`.
+    `path` only labels the `profile` records. mask=False skips the
+    `nodata` comparison for data known to hold none, e.g. binary NEAD.
+
+    The dataset is built in one step from the column arrays, with the index
+    column as dimension coordinate. Float columns are masked and scaled in
+    the parser's buffers and never copied; integer columns are copied only
+    when converted to float. output='pandas' returns a DataFrame instead,
+    with the attributes in `.attrs` and the per-field attributes in
+    `.attrs['fields']`; output='numpy' returns a dictionary of arrays.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = _compact(df, dtype, field_attrs.get('database_fields_data_types'))
+        columns = {c: _parsed_values(df[c]) for c in df.columns}
+        nrows, index = len(df), df.index.to_numpy()
+    else:
+        columns = {v: df[v].data for v in df.data_vars}
+        nrows, index = df.sizes.get('index', 0), df['index'].values
+    names = list(columns.keys())
+    attrs = {n: {key: arr[i] for key, arr in field_attrs.items()} for i, n in enumerate(names)}
+
+    if MKS == True:
+        assert("scale_factor" in field_attrs.keys())
+        assert("add_value" in field_attrs.keys())
+
+    dim = 'index'
+    if index_col != None:
+        with _stage('times', path) as st:
+            st.set(rows=nrows)
+            dim = names[index_col]
+            times = _parse_times(np.asarray(columns[dim]), time_format)
+            if utc and meta.get('timezone') is not None:
+                times = times - _utc_offset(meta['timezone'])
+                attrs[dim]['timezone'] = 'UTC'
+            columns[dim] = times
+
+    # Mask nodata and convert to MKS if requested, in one pass per numeric
+    # variable. String and timestamp variables are left alone.
+    with _stage('mask_and_scale', path) as st:
+        st.set(rows=nrows)
+        nodata = meta.get('nodata') if mask else None
+        float_dtype = np.float32 if dtype == 'compact' else np.float64
+        for n in names:
+            data = columns[n]
+            if n == dim or data.dtype.kind not in 'iuf': continue
+            scale = attrs[n]['scale_factor'] if MKS == True else 1
+            add = attrs[n]['add_value'] if MKS == True else 0
+            if hasattr(data, 'map_blocks'): # dask
+                # Lazy integer fields hold no nodata (see _read_lazy); keep
+                # them integer unless scaled, as _mask_and_scale does
+                if data.dtype.kind in 'iu' and scale == 1 and add == 0: continue
+                out_dtype = data.dtype if data.dtype.kind == 'f' else np.dtype(float_dtype)
+                data = data.astype(out_dtype).map_blocks(_mask_and_scale, nodata, scale, add,
+                                                         dtype=out_dtype)
+            else:
+                data = _mask_and_scale(data, nodata, scale, add, float_dtype)
+            columns[n] = data
+
+    with _stage('build', path) as st:
+        st.set(rows=nrows)
+        if output == 'numpy':
+            return columns
+        data_vars = {n: columns[n] for n in names if n != dim}
+        if output == 'pandas':
+            out = pd.DataFrame(data_vars, index=pd.Index(columns[dim] if dim != 'index'
+                                                         else index, name=dim))
+            out.attrs = dict(meta)
+            out.attrs['fields'] = {n: attrs[n] for n in data_vars.keys()}
+            return out
+        coord = columns[dim] if dim != 'index' else index
+        return xr.Dataset({n: (dim, data, attrs[n]) for n, data in data_vars.items()},
+                          coords={dim: (dim, coord, attrs[dim] if dim != 'index' else {})},
+                          attrs=dict(meta))
+
+def _parsed_values(series):
+    """The values of a freshly parsed column, writable where possible
+
+    Under copy-on-write, pandas returns read-only views. The DataFrame comes
+    from the parser and is not used afterwards, so its float buffers are
+    made writable for `_mask_and_scale` to work in place.
+    """
+    values = series.to_numpy()
+    if values.dtype.kind == 'f' and not values.flags.writeable:
+        try:
+            values.flags.writeable = True
+        except ValueError:
+            pass # memory we do not own, e.g. a read-only memory map; copied if masked
+    return values
+
+def _mask_and_scale(values, nodata=None, scale=1, add=0, float_dtype=np.float64):
+    """Replace `nodata` with nan, then apply `values * scale + add`
+
+    Works in place on float arrays. Integer arrays are returned unchanged
+    when there is nothing to mask or scale, otherwise converted to
+    `float_dtype` once. Float arrays keep their precision (e.g. float32).
+    """
+    if isinstance(nodata, bool) or not isinstance(nodata, (int, float, np.number)):
+        nodata = None
+    mask = None
+    if nodata is not None and not np.isnan(nodata):
+        mask = values == nodata
+        if not mask.any(): mask = None
+    if mask is None and scale == 1 and add == 0:
+        return values
+
+    if values.dtype.kind == 'f' and values.flags.writeable:
+        out = values
+    else:
+        out = values.astype(values.dtype if values.dtype.kind == 'f' else float_dtype)
+    if mask is not None: out[mask] = np.nan
+    if scale != 1: np.multiply(out, scale, out=out, casting='unsafe')
+    if add != 0: np.add(out, add, out=out, casting='unsafe')
+    return out
+
+def _line_blocks(f, data_offset, blocksize):
+    """Read the data section in line-aligned blocks
+
+    RETURNS
+    -------
+    A generator of (offset, buf, starts, ends, blank) per block: the file
+    offset and bytes (as uint8) of the block, the start and end of each
+    line within it, and which lines are blank.
+    """
+    start = data_offset
+    f.seek(start)
+    while True:
+        block = f.read(blocksize)
+        if block == b'': break
+        if not block.endswith(b'\n'):
+            block += f.readline() # extend to the end of the line
+        buf = np.frombuffer(block, dtype=np.uint8)
+        ends = np.flatnonzero(buf == ord('\n'))
+        if len(ends) == 0 or ends[-1] != len(buf) - 1:
+            ends = np.append(ends, len(buf)) # last line has no newline
+        starts = np.concatenate([[0], ends[:-1] + 1])
+        length = ends - starts
+        last = buf[np.maximum(ends - 1, 0)]
+        blank = (length == 0) | ((length == 1) & (last == ord('\r')))
+        yield start, buf, starts, ends, blank
+        start += len(block)
+
+def _block_ranges(f, data_offset, blocksize):
+    """Split the data section into line-aligned byte ranges
+
+    RETURNS
+    -------
+    A list of (start, stop, rows) tuples, where rows is the number of
+    non-blank lines in the range. Lines are counted, not parsed.
+    """
+    ranges = []
+    for start, buf, starts, ends, blank in _line_blocks(f, data_offset, blocksize):
+        rows = int(np.sum(~blank))
+        if rows > 0: ranges.append((start, start + len(buf), rows))
+    return ranges
+
+def _index_ranges(idx, blocksize):
+    """Byte ranges as in `_block_ranges`, from the checkpoints of a sidecar index
+
+    Ranges start and end on checkpoints, so they hold at least `every` rows.
+    """
+    offsets = idx['offsets'] + [idx['data_end']]
+    rows = idx['offset_rows'] + [idx['rows']]
+    ranges, i = [], 0
+    for j in range(1, len(offsets)):
+        if offsets[j] - offsets[i] >= blocksize or j == len(offsets) - 1:
+            if rows[j] > rows[i]: ranges.append((offsets[i], offsets[j], rows[j] - rows[i]))
+            i = j
+    return ranges
+
+def _read_block(neadfile, start, stop, names, FD, usecols, dtype, engine='c', nodata=None):
+    """Parse one byte range of the data section into a DataFrame"""
+    with _open(neadfile) as f:
+        f.seek(start)
+        buf = BytesIO(f.read(stop - start))
+    return _read_csv(buf, names, FD, usecols, engine=engine, nodata=nodata, dtype = dtype)
+
+def _column(df, name):
+    return df[name].values
+
+def _read_lazy(neadfile, f, data_offset, names, FD, usecols, chunks, index_col=None,
+               dtypes=None, compact=False, engine='c', nodata=None, times=None):
+    """Build a dataset with dask-backed variables from the data section
+
+    Each variable is split into blocks of `chunks` bytes that are parsed only
+    when computed. The index column, if any, is held in memory because
+    xarray indexes must be.
+
+    With a current sidecar index (see `build_index`), the blocks, the dtype
+    of each field and, for evenly spaced timestamps, the index column come
+    from it, so the data section is not read. Otherwise the lines are
+    counted, the index column is parsed, and the dtypes are taken from a
+    sample: numbers are parsed as floats, as a later block may hold
+    missing values.
+    """
+    import dask
+    import dask.array as da
+    from dask.utils import parse_bytes
+
+    idx = _load_index(neadfile, 0 if index_col is None else index_col)
+    if idx is not None and 'dtypes' not in idx: idx = None # built before dtypes were kept
+    numeric = np.float32 if compact else float
+    if idx is not None:
+        ranges = _index_ranges(idx, parse_bytes(chunks))
+        dtype = {names[i]: (numeric if compact and idx['dtypes'][names[i]] in ['int64', 'float64']
+                            else np.dtype(idx['dtypes'][names[i]]))
+                 for i in usecols if names[i] in idx['dtypes']}
+    else:
+        ranges = _block_ranges(f, data_offset, parse_bytes(chunks))
+        # Fix dtypes from a small sample so that every block parses the same way
+        f.seek(data_offset)
+        sample = _read_csv(f, names, FD, usecols, nrows = 100)
+        dtype = {n: (numeric if sample[n].dtype.kind in 'iufb' else object) for n in sample.columns}
+    if dtypes: dtype.update(dtypes)
+    nrows = sum(r[2] for r in ranges)
+
+    blocks = [dask.delayed(_read_block)(neadfile, start, stop, names, FD, usecols, dtype,
+                                        engine, nodata)
+              for (start, stop, rows) in ranges]
+    data_vars = {}
+    for i in usecols:
+        n = names[i]
+        if i == index_col and idx is not None and idx['time_step'] is not None:
+            t0, step = idx['time_step']
+            col = (t0 + step * np.arange(nrows, dtype=np.int64)).astype('datetime64[ns]')
+        elif i == index_col:
+            f.seek(data_offset)
+            col = _read_csv(f, names, FD, [i], times=times)[n].values
+        else:
+            col = da.concatenate([
+                da.from_delayed(dask.delayed(_column)(b, n),
+                                shape=(r[2],), dtype=np.dtype(dtype[n]))
+                for (b, r) in zip(blocks, ranges)]) if ranges else np.array([], dtype=dtype[n])
+        data_vars[n] = ('index', col)
+    return xr.Dataset(data_vars, coords={'index': np.arange(nrows)})
+
+def read(neadfile, MKS=None, multi_index=True, index_col=None, chunks=None,
+         variables=None, time_slice=None, dtype=None, engine='c', utc=False,
+         output='xarray', resample=None, how='mean'):
     """Read a NEAD file
 
+    PARAMETERS
+    ----------
+    file: string or file object
+        Path to NEAD-formatted file, or a binary file object (e.g. BytesIO)
+        positioned at the start of a NEAD text file. NEAD text may be
+        compressed with gzip, bzip2 or zstd.
+
+
+    KEYWORDS
+    --------
+    index_col: integer
+        Use column as index
+    chunks: integer or string
+        If set, return a lazy dataset backed by dask arrays. The data section
+        is split into byte ranges of this size (e.g. '64MB') that are only
+        parsed on `.compute()`. Requires dask. With a sidecar index (see
+        `build_index`) the data section is not read at all until then, and
+        the dtypes are those of an eager `read`; otherwise the lines are
+        counted, the index column is parsed and numbers become floats.
+    variables: list of strings
+        Only parse these fields. The index column is always included.
+    time_slice: tuple
+        (start, end) timestamps, inclusive; either may be None. Requires
+        `index_col`. Only the byte range located through the sidecar index
+        (see `build_index`) is parsed. The index is built if missing or stale.
+    dtype: string or dict
+        'compact' parses fields declared as floats in
+        `database_fields_data_types` as float32; other float64 fields become
+        float32, and integer fields their declared width (e.g. int8 or
+        smallint), or float32 if any value is `nodata` or empty. Masked and
+        scaled values are float32. A dictionary gives the parser dtype
+        per field.
+    engine: string
+        CSV parser: 'c' (pandas, default), 'pyarrow' (multithreaded) or
+        'polars'. All engines return the same dataset.
+    utc: boolean
+        Shift the index column from the header `timezone` (hours, or e.g.
+        '+01:00') to UTC.
+    output: string
+        'xarray' (default), 'pandas' for a DataFrame indexed by the index
+        column, with the attributes in `.attrs` and the per-field attributes
+        in `.attrs['fields']`, or 'numpy' for a dictionary of arrays, one per
+        field. Not supported with `chunks`.
+    resample: string
+        Aggregate into time bins of this frequency (e.g. '1h', '1D', 'MS')
+        while streaming through the file, after `nodata` masking and MKS
+        scaling. Only one chunk of rows and the per-bin results are held in
+        memory. Requires `index_col`. Bins are those of
+        `ds.resample({index: resample})`. Numeric fields only.
+    how: string or list of strings
+        Aggregations for `resample`: 'mean', 'sum', 'min', 'max' and
+        'count' (of values that are not nan). A string keeps the field
+        names; a list names the results `<field>_<how>`, e.g.
+        how=['mean', 'max'] gives TA_mean and TA_max. Each result has a
+        `cell_methods` attribute such as 'timestamp: mean'.
+
+    The index column is parsed by the CSV engine with the strftime format
+    guessed from the first data line (ISO 8601 otherwise), into
+    datetime64[ns].
+    
+    Compressed NEAD text is detected from its first bytes and decompressed
+    as it is parsed. Byte offsets (chunks, the sidecar index, `NeadTail`)
+    count decompressed bytes. zstd files written by `write` carry a seek
+    table, so `chunks`, `time_slice` and `NeadTail` decompress only the
+    frames they need; gzip and bzip2 files are decompressed from the start.
+
+    Parquet, Feather and NetCDF files written by `write` are detected from
+    their first bytes and loaded without text parsing. The fields of binary
+    NEAD files are memory-mapped, and not copied unless MKS or the index
+    conversion requires it.
+
+    RETURNS
+    -------
+    An xarray dataset, DataFrame or dictionary of arrays, see `output`.
+    """
+    assert(output in ['xarray', 'pandas', 'numpy']), print('Unknown output: ', output)
+    assert(chunks is None or output == 'xarray'), print('chunks requires output=\'xarray\'')
+    if resample is not None:
+        assert(chunks is None and time_slice is None and engine == 'c'), \
+            print('resample is not supported with chunks, time_slice or engine')
+        assert(not hasattr(neadfile, 'read')), print('resample needs a path, not a file object')
+        return _read_resampled(neadfile, resample, how, MKS=MKS, index_col=index_col,
+                               variables=variables, dtype=dtype, utc=utc, output=output)
+
+    is_file = hasattr(neadfile, 'read')
+    if is_file:
+        assert(chunks is None and time_slice is None), \
+            print('chunks and time_slice need a path, not a file object')
+    label = getattr(neadfile, 'name', None) if is_file else neadfile
+    time_format = None
+    with contextlib.ExitStack() as stack:
+        # Detect the format on the handle used for reading: Parquet, Feather
+        # and NetCDF from the first bytes, binary NEAD from the parsed header
+        raw = neadfile if is_file else stack.enter_context(open(neadfile, 'rb'))
+        fmt = 'nead' if is_file else _columnar_format(raw)
+        f, layout = None, None
+        with _stage('header', label) as st:
+            if fmt == 'nead':
+                f = stack.enter_context(_open(raw))
+                hdr = _parse_header(f)
+                st.set(nbytes=hdr.data_offset)
+                if hdr.meta.get('data_format') == 'binary':
+                    assert(f is raw and not is_file), \
+                        print('Binary NEAD files must be read from an uncompressed path: ', label)
+                    fmt, layout = 'nead-binary', hdr
+            if fmt != 'nead':
+                hdr = _binary_header(neadfile, fmt, layout)
+            meta, names = hdr.meta, hdr.names
+            usecols = _usecols(names, variables, index_col)
+            field_attrs = hdr.field_attrs(usecols)
+
+        if fmt != 'nead':
+            # Parquet, Feather, NetCDF or binary NEAD written by `write`: no text parsing
+            assert(chunks is None), print('chunks is only supported for text NEAD files')
+            with _stage('parse', label) as st:
+                df = _read_binary(neadfile, fmt, [names[i] for i in usecols], f=f, hdr=layout)
+                st.set(rows=len(df), nbytes=os.path.getsize(neadfile))
+        else:
+            FD, data_offset = hdr.delimiter, hdr.data_offset
+            dtypes = _parser_dtypes(field_attrs, names, usecols, dtype, index_col)
+            nodata = meta.get('nodata')
+            times = None
+            if index_col != None:
+                time_format = _time_format(f, FD, index_col)
+                times = (names[index_col], time_format)
+
+            with _stage('parse', label) as st:
+                if chunks is not None:
+                    assert(time_slice is None), print('time_slice is not supported with chunks')
+                    df = _read_lazy(neadfile, f, data_offset, names, FD, usecols, chunks,
+                                    index_col=index_col, dtypes=dtypes,
+                                    compact=(dtype == 'compact'), engine=engine, nodata=nodata,
+                                    times=times)
+                    nbytes = f.seek(0, os.SEEK_END) - data_offset
+                elif time_slice is not None:
+                    assert(index_col != None), print('time_slice requires index_col')
+                    idx = _load_index(neadfile, index_col)
+                    if idx is None: idx = build_index(neadfile, index_col=index_col)
+                    # The sidecar index holds file-local times; time_slice is in UTC if utc
+                    shift = _utc_offset(meta['timezone']) if utc and meta.get('timezone') is not None \
+                        else np.timedelta64(0, 's')
+                    start, stop = _index_range(idx, *[None if t is None else pd.Timestamp(t).to_datetime64() + shift
+                                                      for t in time_slice])
+                    f.seek(start)
+                    buf = BytesIO(f.read() if stop is None else f.read(stop - start))
+                    nbytes = len(buf.getbuffer())
+                    df = _read_csv(buf, names, FD, usecols, engine=engine, nodata=nodata,
+                                   times=times, dtype = dtypes)
+                else:
+                    # The handle is already positioned at the first data line, so the
+                    # CSV engine starts there and never sees (or re-scans) the header.
+                    df = _read_csv(f, names, FD, usecols, engine=engine, nodata=nodata,
+                                   times=times, dtype = dtypes)
+                    nbytes = f.tell() - data_offset
+                st.set(rows=len(df) if isinstance(df, pd.DataFrame) else df.sizes['index'],
+                       nbytes=nbytes)
+
+    if index_col != None: index_col = usecols.index(index_col)
+    ds = _to_dataset(df, meta, field_attrs, MKS=MKS, index_col=index_col, dtype=dtype,
+                     time_format=time_format, utc=utc, path=label,
+                     mask=(fmt != 'nead-binary'), output=output)
+    if time_slice is not None:
+        colname = names[usecols[index_col]]
+        with _stage('select_time', label) as st:
+            ds = _select_time(ds, colname, *time_slice)
+            st.set(rows=len(ds) if output == 'pandas' else len(ds[colname]))
+    return ds
+
+def _read_complete_lines(f, start):
+    """Read from `start` up to and including the last newline
+
+    RETURNS
+    -------
+    The bytes and the offset just past them. A partially written last line
+    is left for the next call.
+    """
+    f.seek(start)
+    buf = f.read()
+    end = buf.rfind(b'\n') + 1
+    return buf[:end], start + end
+
+def _end_of_lines(f, start, blocksize=2**12):
+    """Offset just past the last newline at or after `start`
+
+    Reads backwards from the end of `f`, so only the partially written last
+    line is read. Returns `start` if there is no newline.
+    """
+    pos = f.seek(0, os.SEEK_END)
+    while pos > start:
+        step = min(blocksize, pos - start)
+        pos -= step
+        f.seek(pos)
+        i = f.read(step).rfind(b'\n')
+        if i >= 0: return pos + i + 1
+    return start
+
+def read_new_rows(neadfile, since_offset=None, MKS=None, index_col=None, variables=None):
+    """Read rows appended to a NEAD file since a byte offset
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted file
+    since_offset: integer
+        Byte offset returned by the previous call. None reads from the first
+        data line.
+
+
+    KEYWORDS
+    --------
+    MKS, index_col, variables: as for `read`
+
+    RETURNS
+    -------
+    An xarray dataset with the new (complete) rows, and the offset to pass
+    to the next call.
+    """
+    with _open(neadfile) as f:
+        hdr = _parse_header(f)
+    tail = NeadTail(neadfile, MKS=MKS, index_col=index_col, variables=variables, header=hdr)
+    if since_offset is not None: tail.offset = since_offset
+    ds = tail.poll()
+    return ds, tail.offset
+
+class NeadTail:
+    """Follow a growing NEAD file
+
+    The header is parsed once. Each `poll` parses only the complete lines
+    appended since the previous poll.
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted file
+
+
+    KEYWORDS
+    --------
+    MKS, index_col, variables: as for `read`
+    from_end: bool
+        Start at the current end of the file instead of the first data line
+
+    ATTRIBUTES
+    ----------
+    offset: integer
+        Byte offset of the first unconsumed data line
+    """
+    def __init__(self, neadfile, MKS=None, index_col=None, variables=None,
+                 from_end=False, header=None):
+        self.neadfile = neadfile
+        self.MKS = MKS
+        self.index_col = index_col
+        self.variables = variables
+        if header is None:
+            with _open(neadfile) as f:
+                header = _parse_header(f)
+        self._set_header(header)
+        self.offset = self.header.data_offset
+        if from_end:
+            with _open(neadfile) as f:
+                self.offset = _end_of_lines(f, self.offset)
+
+    def _set_header(self, header):
+        self.header = header
+        self.usecols = _usecols(header.names, self.variables, self.index_col)
+        self.field_attrs = header.field_attrs(self.usecols)
+
+    def poll(self):
+        """Return the rows appended since the last poll as an xarray dataset"""
+        hdr = self.header
+        with _open(self.neadfile) as f:
+            if f.seek(0, os.SEEK_END) < self.offset:
+                # File was truncated or replaced: start again from its header
+                self._set_header(_parse_header(f))
+                self.offset = self.header.data_offset
+                hdr = self.header
+            buf, self.offset = _read_complete_lines(f, self.offset)
+        df = _read_csv(BytesIO(buf), hdr.names, hdr.delimiter, self.usecols)
+        index_col = None if self.index_col == None else self.usecols.index(self.index_col)
+        return _to_dataset(df, hdr.meta, self.field_attrs, MKS=self.MKS, index_col=index_col)
+
+_HOW = ['mean', 'sum', 'min', 'max', 'count']
+
+def _read_resampled(neadfile, freq, how, MKS=None, index_col=None, variables=None,
+                    dtype=None, utc=False, output='xarray', chunksize=100000):
+    """`read` aggregated into time bins of `freq` while streaming
+
+    Each chunk from `iter_chunks` (masked and scaled) is reduced to per-bin
+    sums, counts, minima and maxima, which are combined at the end. Only
+    the current chunk and the per-bin accumulators are held in memory. Bins
+    follow `xarray.Dataset.resample`: left-closed and left-labelled, from
+    the start of the first day, with empty bins between the first and last.
+    """
+    hows = [how] if isinstance(how, str) else list(how)
+    for h in hows:
+        assert(h in _HOW), print('Unknown aggregation: ', h, _HOW)
+    assert(index_col != None), print('resample requires index_col')
+
+    hdr = _header_of(neadfile)
+    dim = hdr.names[index_col]
+    if _file_format(neadfile) == 'nead':
+        frames = iter_chunks(neadfile, chunksize=chunksize, MKS=MKS, index_col=index_col,
+                             output='pandas', variables=variables, dtype=dtype, utc=utc)
+    else:
+        # binary formats are memory-mapped or columnar: aggregate in one pass
+        frames = [read(neadfile, MKS=MKS, index_col=index_col, variables=variables,
+                       dtype=dtype, utc=utc, output='pandas')]
+
+    # Fixed frequencies bin from the start of the first day in every chunk;
+    # calendar frequencies (e.g. 'MS') are anchored anyway
+    tick = isinstance(pd.tseries.frequencies.to_offset(freq), pd.offsets.Tick)
+    origin, field_attrs, dtypes = None, {}, {}
+    sums, counts, mins, maxs = [], [], [], []
+    for df in frames:
+        with _stage('aggregate', neadfile) as st:
+            st.set(rows=len(df))
+            field_attrs = df.attrs['fields']
+            df = df[[c for c in df.columns if df[c].dtype.kind in 'iufb']]
+            df = df[df.index.notna()]
+            if len(df) == 0: continue
+            dtypes.update(df.dtypes.to_dict())
+            if origin is None: origin = df.index.min().floor('D')
+            bins = df.resample(freq, origin=origin) if tick else df.resample(freq)
+            if 'mean' in hows or 'sum' in hows: sums.append(bins.sum())
+            counts.append(bins.count())
+            if 'min' in hows: mins.append(bins.min())
+            if 'max' in hows: maxs.append(bins.max())
+
+    assert(counts), print('No timestamped rows to resample in ', neadfile)
+
+    # Combine bins split across chunks; fill the empty bins in between
+    count = pd.concat(counts).groupby(level=0).sum()
+    bins = pd.date_range(count.index.min(), count.index.max(), freq=freq)
+    count = count.reindex(bins, fill_value=0).astype(np.int64)
+    def combine(parts, func):
+        return getattr(pd.concat(parts).groupby(level=0), func)().reindex(bins)
+    stats = {'count': count}
+    if sums:
+        stats['sum'] = combine(sums, 'sum').fillna(0)
+        stats['mean'] = stats['sum'] / count.where(count > 0)
+    if mins: stats['min'] = combine(mins, 'min')
+    if maxs: stats['max'] = combine(maxs, 'max')
+
+    columns = {}
+    attrs = {}
+    for c in dtypes.keys():
+        for h in hows:
+            n = c if isinstance(how, str) else c + '_' + h
+            data = stats[h][c].to_numpy()
+            kind = dtypes[c].kind
+            if h == 'mean' and kind == 'f' or h in ['min', 'max'] and not np.isnan(data).any():
+                data = data.astype(dtypes[c]) # keep float32, and integers without empty bins
+            elif h == 'sum' and kind in 'iub':
+                data = data.astype(np.int64)
+            columns[n] = data
+            attrs[n] = dict(field_attrs.get(c, {}), cell_methods='%s: %s' % (dim, h))
+            if h == 'count': attrs[n] = {'cell_methods': attrs[n]['cell_methods']}
+
+    dim_attrs = {key: arr[index_col] for key, arr in hdr.field_attrs().items()}
+    if utc and hdr.meta.get('timezone') is not None: dim_attrs['timezone'] = 'UTC'
+    times = bins.to_numpy().astype('datetime64[ns]')
+    if output == 'numpy':
+        return dict({dim: times}, **columns)
+    if output == 'pandas':
+        out = pd.DataFrame(columns, index=pd.Index(times, name=dim))
+        out.attrs = dict(hdr.meta)
+        out.attrs['fields'] = attrs
+        return out
+    return xr.Dataset({n: (dim, data, attrs[n]) for n, data in columns.items()},
+                      coords={dim: (dim, times, dim_attrs)},
+                      attrs=dict(hdr.meta))
+
+def _select_time(ds, colname, t0, t1):
+    """Keep rows of `ds` with t0 <= colname <= t1
+
+    `ds` is a dataset, a DataFrame indexed by `colname` or a dictionary of
+    arrays, as returned by `_to_dataset`.
+    """
+    t = ds.index.values if isinstance(ds, pd.DataFrame) else np.asarray(ds[colname])
+    keep = np.ones(t.shape, dtype=bool)
+    if t0 is not None: keep &= (t >= pd.Timestamp(t0).to_datetime64())
+    if t1 is not None: keep &= (t <= pd.Timestamp(t1).to_datetime64())
+    if isinstance(ds, pd.DataFrame): return ds[keep]
+    if isinstance(ds, dict): return {k: v[keep] for k,v in ds.items()}
+    return ds.isel({colname: keep})
+
+def _index_path(neadfile):
+    return str(neadfile) + '.idx'
+
+def build_index(neadfile, every=10000, index_col=0):
+    """Build the sidecar time index for a NEAD file
+
+    The index stores the timestamp and byte offset of every `every`-th data
+    line, and is written to `neadfile` + '.idx'. It is tied to the size and
+    modification time of `neadfile` and ignored once either changes.
+    The timestamps of all rows are checked; if any row is out of order, the
+    index is marked unsorted and `time_slice` reads the whole file. The
+    index also records the row count at each checkpoint, the dtype `read`
+    gives each field, and the time step if the timestamps are evenly
+    spaced, so that `read(chunks=...)` need not scan the file.
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted file
+
+
+    KEYWORDS
+    --------
+    every: integer
+        Rows between checkpoints
+    index_col: integer
+        Timestamp column
+
+    RETURNS
+    -------
+    The index as a dictionary.
+    """
+    blocksize = 2**24
+    with _open(neadfile) as f:
+        hdr = _parse_header(f)
+        FD, data_offset = hdr.delimiter, hdr.data_offset
+        name = hdr.names[index_col]
+        times = (name, _time_format(f, FD, index_col))
+
+        # Record the start of every `every`-th line, and check that the
+        # timestamps of all rows, not only the checkpoints, are in order.
+        # Each block is parsed as `read` would, to record the dtype of every
+        # field and whether the timestamps are evenly spaced.
+        checkpoints = []
+        ordered, first, last, step = True, None, None, None
+        line, rows, kinds = 0, 0, {}
+        nodata = hdr.meta.get('nodata')
+        for start, buf, starts, ends, blank in _line_blocks(f, data_offset, blocksize):
+            before = rows + np.cumsum(~blank) - ~blank
+            sel = np.flatnonzero(((line + np.arange(len(starts))) % every == 0) & ~blank)
+            text = buf.tobytes()
+            for i in sel:
+                l = text[starts[i]:ends[i]].decode('utf-8')
+                checkpoints.append((l.split(FD)[index_col].strip(), start + int(starts[i]),
+                                    int(before[i])))
+            line += len(starts)
+            rows += int(np.sum(~blank))
+            if np.all(blank): continue
+            df = _read_csv(BytesIO(text), hdr.names, FD, list(range(len(hdr.names))),
+                           nodata=nodata, times=times)
+            for n in hdr.names:
+                if n == name: continue
+                values = df[n].to_numpy()
+                kind = values.dtype.kind if values.dtype.kind in 'iufb' else 'O'
+                if kind in 'iu' and _mask_and_scale(values, nodata).dtype.kind == 'f': kind = 'f'
+                kinds.setdefault(n, set()).add(kind)
+            t = _parse_times(np.asarray(df[name]))
+            if first is None: first = t[0]
+            if last is not None: t = np.concatenate([[last], t])
+            ordered = ordered and bool(np.all(t[1:] >= t[:-1]))
+            d = np.diff(t)
+            if step is None and len(d): step = d[0]
+            if np.isnat(t).any() or (len(d) and np.any(d != step)): step = np.timedelta64('NaT')
+            last = t[-1]
+        end = f.tell()
+
+    def merged(k):
+        return {'i': 'int64', 'f': 'float64', 'b': 'bool'}[k.pop()] if len(k) == 1 \
+            else 'float64' if k <= {'i', 'f'} else 'object'
+    regular = rows > 0 and not (step is not None and np.isnat(step))
+    st = os.stat(neadfile)
+    idx = {'size': st.st_size,
+           'mtime_ns': st.st_mtime_ns,
+           'index_col': index_col,
+           'every': every,
+           'data_offset': data_offset,
+           'data_end': end,
+           'rows': rows,
+           'sorted': ordered,
+           'dtypes': dict({name: 'object'}, **{n: merged(k) for n,k in kinds.items()}),
+           'time_step': ([int(first.astype(np.int64)), int(step.astype('timedelta64[ns]').astype(np.int64))
+                          if step is not None else 0] if regular else None),
+           'times': [c[0] for c in checkpoints],
+           'offsets': [c[1] for c in checkpoints],
+           'offset_rows': [c[2] for c in checkpoints]}
+    try:
+        with open(_index_path(neadfile), 'w') as f:
+            json.dump(idx, f)
+    except OSError:
+        pass # read-only location; use the index for this call only
+    return idx
+
+def _load_index(neadfile, index_col=0):
+    """Load the sidecar index, or None if it is missing or stale"""
+    try:
+        with open(_index_path(neadfile)) as f:
+            idx = json.load(f)
+    except (OSError, ValueError):
+        return None
+    st = os.stat(neadfile)
+    if (idx.get('size') != st.st_size or idx.get('mtime_ns') != st.st_mtime_ns
+        or idx.get('index_col') != index_col):
+        return None
+    return idx
+
+def _index_range(idx, t0=None, t1=None):
+    """Return the (start, stop) byte range holding rows in [t0, t1]
+
+    stop is None to read to the end of the file.
+    """
+    start, stop = idx['data_offset'], None
+    if not idx['sorted'] or len(idx['times']) == 0: return start, stop
+    times = _parse_times(np.asarray(idx['times'], dtype=object))
+    offsets = idx['offsets']
+    if t0 is not None:
+        i = np.searchsorted(times, pd.Timestamp(t0).to_datetime64(), side='left') - 1
+        if i >= 0: start = offsets[i]
+    if t1 is not None:
+        i = np.searchsorted(times, pd.Timestamp(t1).to_datetime64(), side='right')
+        if i < len(offsets): stop = offsets[i]
+    return start, stop
+
+def iter_chunks(neadfile, chunksize=100000, MKS=None, index_col=None, output='xarray',
+                variables=None, dtype=None, utc=False):
+    """Iterate over a NEAD file in fixed-size row chunks
+
+    The header is parsed once. Each chunk carries the same global and
+    per-field attributes as `read` and has MKS conversion and `nodata`
+    masking applied, so only one chunk is held in memory at a time.
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted file
+
+
+    KEYWORDS
+    --------
+    chunksize: integer
+        Number of rows per chunk
+    MKS: bool
+        Convert to MKS units
+    index_col: integer
+        Use column as index
+    output: string
+        'xarray' to yield datasets, 'pandas' to yield DataFrames, 'numpy' to
+        yield dictionaries of arrays. DataFrame chunks hold the global
+        attributes in `.attrs`, and the per-field attributes in
+        `.attrs['fields']`.
+    variables: list of strings
+        Only parse these fields. The index column is always included.
+    dtype: string or dict
+        'compact' or per-field parser dtypes, as for `read`
+    utc: boolean
+        Shift the index column to UTC, as for `read`
+
+    RETURNS
+    -------
+    A generator of xarray datasets or pandas DataFrames.
+    """
+    assert(output in ['xarray', 'pandas', 'numpy']), print('Unknown output: ', output)
+    with _open(neadfile) as f:
+        with _stage('header', neadfile) as st:
+            hdr = _parse_header(f)
+            meta, FD, names, data_offset = hdr.meta, hdr.delimiter, hdr.names, hdr.data_offset
+            usecols = _usecols(names, variables, index_col)
+            field_attrs = hdr.field_attrs(usecols)
+            st.set(nbytes=data_offset)
+        dtypes = _parser_dtypes(field_attrs, names, usecols, dtype, index_col)
+        times, time_format = None, None
+        if index_col != None:
+            time_format = _time_format(f, FD, index_col)
+            times = (names[index_col], time_format)
+            index_col = usecols.index(index_col)
+
+        pos = f.tell()
+        reader = _read_csv(f, names, FD, usecols, nodata=meta.get('nodata'),
+                           times = times, chunksize = chunksize, dtype = dtypes)
+        with reader:
+            while True:
+                with _stage('parse', neadfile) as st:
+                    df = next(reader, None)
+                    # bytes the engine has buffered from the file
+                    st.set(rows=0 if df is None else len(df), nbytes=f.tell() - pos)
+                    pos = f.tell()
+                if df is None: break
+                yield _to_dataset(df, meta, field_attrs, MKS=MKS, index_col=index_col,
+                                  dtype=dtype, time_format=time_format, utc=utc,
+                                  path=neadfile, output=output)
+
+def validate(neadfile, blocksize=2**24):
+    """Check a NEAD file against its header
+
+    Checks that the header parses, that every [FIELDS] entry has one value
+    per field and that every data line of a text file has one value per
+    field. If these pass, the whole file is read with `read`, so that values
+    which do not parse are reported too.
+
     PARAMETERS
     ----------
     file: string
-        Path to NEAD-formatted file
+        Path to NEAD-formatted file (text or binary)
+
+    RETURNS
+    -------
+    A list of problems, empty if the file is valid.
+    """
+    try:
+        hdr = _header_of(neadfile)
+    except Exception as e:
+        return ['header does not parse: ' + (str(e) or type(e).__name__)]
+    n = len(hdr.names)
+    problems = []
+    for key, val in hdr.fields.items():
+        if len(str(val).split(hdr.delimiter)) != n:
+            problems.append('[FIELDS] %s has %d values for %d fields'
+                            % (key, len(str(val).split(hdr.delimiter)), n))
+
+    if _file_format(neadfile) == 'nead':
+        FD = hdr.delimiter.encode('utf-8')
+        bad, shown = 0, []
+        with _open(neadfile) as f:
+            f.seek(0)
+            line = f.read(hdr.data_offset).count(b'\n') + 1 # file line number
+            for start, buf, starts, ends, blank in _line_blocks(f, hdr.data_offset, blocksize):
+                if len(FD) == 1:
+                    delims = np.flatnonzero(buf == FD[0])
+                    counts = np.searchsorted(delims, ends) - np.searchsorted(delims, starts)
+                else:
+                    counts = np.array([buf[a:b].tobytes().count(FD) for a,b in zip(starts, ends)])
+                wrong = np.flatnonzero(~blank & (counts != n - 1))
+                bad += len(wrong)
+                shown += ['line %d has %d values for %d fields' % (line + i, counts[i] + 1, n)
+                          for i in wrong[:max(0, 5 - len(shown))]]
+                line += len(ends)
+        problems += shown
+        if bad > len(shown): problems.append('%d more lines with the wrong number of values'
+                                             % (bad - len(shown)))
+    if problems: return problems
+
+    try:
+        read(neadfile)
+    except Exception as e:
+        problems.append('read failed: ' + (str(e) or type(e).__name__))
+    return problems
+
+def _header_of(path):
+    """Parse only the header of a NEAD (or binary columnar) file"""
+    with open(path, 'rb') as raw:
+        fmt = _columnar_format(raw)
+        if fmt == 'nead':
+            with _open(raw) as f:
+                hdr = _parse_header(f)
+            if hdr.meta.get('data_format') != 'binary': return hdr
+            return _binary_header(path, 'nead-binary', hdr)
+    return _binary_header(path, fmt)
+
+def _check_schemas(paths, headers):
+    """Raise ValueError unless all files share fields and units"""
+    def units(h):
+        u = h.field_attrs().get('units')
+        return None if u is None else [str(_) for _ in u]
+
+    ref = headers[0]
+    for p, h in zip(paths[1:], headers[1:]):
+        if h.names != ref.names:
+            raise ValueError('Fields in {0} {1} do not match fields in {2} {3}'.format(
+                p, h.names, paths[0], ref.names))
+        if units(h) != units(ref):
+            raise ValueError('Units in {0} {1} do not match units in {2} {3}'.format(
+                p, units(h), paths[0], units(ref)))
+
+def open_mfdataset(paths, combine='time', parallel=True, max_workers=None, **kwargs):
+    """Read many NEAD files into one dataset
+
+    Headers are parsed first and must share the same fields and units. The
+    files are then read in a process pool and combined.
+
+    PARAMETERS
+    ----------
+    paths: string or list of strings
+        Paths, or a glob pattern
 
 
     KEYWORDS
     --------
-    index_col: integer
-        Use column as index
-    
+    combine: string
+        'time' to concatenate along the index dimension, or 'station' to
+        concatenate each station_id along time and stack the stations along
+        a new 'station' dimension. Metadata that differs between stations
+        (e.g. latitude) becomes a coordinate on 'station'.
+    parallel: bool
+        Read files in a process pool
+    max_workers: integer
+        Number of processes. Default is the number of CPUs.
+    kwargs:
+        Passed to `read`, e.g. index_col, MKS, variables
+
     RETURNS
     -------
     An xarray dataset.
     """
+    if isinstance(paths, (str, Path)):
+        paths = sorted(glob.glob(str(paths)))
+    paths = [str(p) for p in paths]
+    if len(paths) == 0: raise ValueError('No files to open')
+    assert(combine in ['time', 'station']), print('Unknown combine: ', combine)
 
+    headers = [_header_of(p) for p in paths]
+    _check_schemas(paths, headers)
 
-    with open(neadfile) as f:
-        fmt = f.readline();
-        assert(fmt[0] == "#")
-        assert(fmt.split("#")[1].split()[0] == "NEAD")
-        assert(fmt.split("#")[1].split()[1] == "1.0")
-        assert(fmt.split("#")[1].split()[2] == "UTF-8")
-        
-        line = f.readline()
-        assert(line[0] == "#")
-        assert(line.split("#")[1].strip() == '[METADATA]')
-
-        meta = {}
-        fields = {}
-        section = 'meta'
-        while True:
-            line = f.readline()
-            if line.strip(' ') == '#': continue
-            if line == "# [DATA]\n": break # done reading header
-            if line == "# [FIELDS]\n":
-                section = 'fields'
-                continue # done reading header
-            
-            if line[0] == "\n": continue   # blank line
-            assert(line[0] == "#")         # if not blank, must start with "#"
-            
-            key_eq_val = line.split("#")[1].strip()
-            if key_eq_val == '' or key_eq_val == None: continue  # Line is just "#" or "# " or "#   #"...
-            assert("=" in key_eq_val), print(line, key_eq_val)
-            key = key_eq_val.split("=")[0].strip()
-            val = key_eq_val.split("=")[1].strip()
-
-            # Convert from string to number if it is a number
-            if val.strip('-').strip('+').replace('.','').isdigit():
-                val = float(val)
-                if val == int(val):
-                    val = int(val)
-
-            if section == 'meta': meta[key] = val
-            if section == 'fields': fields[key] = val
-    # done reading header
+    reader = functools.partial(read, **kwargs)
+    if parallel and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            datasets = list(pool.map(reader, paths))
+    else:
+        datasets = [reader(p) for p in paths]
 
-    # Find delimiter and fields for reading NEAD as simple CSV
-    assert("field_delimiter" in meta.keys())
-    assert("fields" in fields.keys())
-    FD = meta["field_delimiter"]
-    names = [_.strip() for _ in fields.pop('fields').split(FD)]
+    def _along_time(dss):
+        dim = list(dss[0].dims)[0]
+        ds = xr.concat(dss, dim=dim, combine_attrs='override')
+        if dim == 'index':
+            ds['index'] = np.arange(ds.sizes['index'])
+        elif ds.indexes[dim].is_monotonic_increasing == False:
+            ds = ds.sortby(dim)
+        return ds
 
-    df = pd.read_csv(neadfile,
-                     comment = "#",
-                     names = names,
-                     sep = FD,
-                     usecols=np.arange(len(names)),
-                     skip_blank_lines = True)
-
-    ds = df.to_xarray()
-    ds.attrs = meta
-
-    # For each of the per-field properties, add as attributes to that variable.
-    for key in fields.keys():      
-        assert(len(fields[key].split(FD)) == len(names)), print('Error reading NEAD file: ',
-                                                                key,' has ',
-              len(fields[key].split(FD)),'items for ',len(names),' fields')
-        arr = [_.strip() for _ in fields[key].split(FD)]
-        # convert to numeric if only contains numbers
-        if all([str(s).strip('-').strip('+').replace('.','').isdigit() or str(s) == "" for s in arr]):
-            arr = np.array(arr).astype("<U32")
-            arr[arr == ""] = 'nan'
-            arr = arr.astype(float)
-            if all(arr == arr.astype(int)):
-                arr = arr.astype(int)
-                    
-        for i,v in enumerate(ds.data_vars):
-            # print(i,v)
-            ds[v].attrs[key] = arr[i]
-                
-    # Convert to MKS if requested
-    if MKS == True:
-        assert("scale_factor" in fields.keys())
-        assert("add_value" in fields.keys())
-        for v in list(ds.keys()):
-            if ds[v].dtype.kind in ['i','f']:
-                ds[v] = (ds[v] * ds[v].scale_factor) + ds[v].add_value
+    if combine == 'time':
+        return _along_time(datasets)
 
-    # Set index_col if requested
-    if index_col != None:
-        colname = list(ds.keys())[index_col]
-        # ds = ds.set_coords(colname)
-        ds = ds.swap_dims({'index':colname}).reset_coords(names='index', drop=True)
-        ds[colname] = ds[colname].astype(np.datetime64)
-            
-    # Clean up.
-    if('nodata' in ds.attrs.keys()): ds = ds.where(ds != ds.attrs['nodata'])
+    stations = {}
+    for ds in datasets:
+        stations.setdefault(ds.attrs.get('station_id'), []).append(ds)
+    combined = [_along_time(dss) for dss in stations.values()]
+    keys = list(dict.fromkeys(k for ds in combined for k in ds.attrs.keys()))
+    common = {k: combined[0].attrs[k] for k in keys
+              if all(k in ds.attrs and str(ds.attrs[k]) == str(combined[0].attrs[k])
+                     for ds in combined)}
+    varying = [k for k in keys if k not in common and k != 'station_id']
+    ds = xr.concat(combined, dim=pd.Index(list(stations.keys()), name='station', dtype=object),
+                   join='outer', combine_attrs='override')
+    ds.attrs = common
+    for k in varying:
+        ds.coords[k] = ('station', [c.attrs.get(k, np.nan) for c in combined])
     return ds
 
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    format TEXT,
+    station_id TEXT,
+    timezone TEXT,
+    time_start TEXT,
+    time_end TEXT,
+    rows INTEGER,
+    rows_exact INTEGER,
+    metadata TEXT,
+    error TEXT);
+CREATE TABLE IF NOT EXISTS fields (
+    path TEXT,
+    position INTEGER,
+    name TEXT,
+    units TEXT,
+    attrs TEXT,
+    PRIMARY KEY (path, position));
+CREATE INDEX IF NOT EXISTS fields_name ON fields (name);
+CREATE INDEX IF NOT EXISTS files_time ON files (time_start, time_end);
+"""
+
+def _json(obj):
+    return json.dumps(obj, default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+
+def _line_time(line, FD, index_col):
+    """Timestamp of the index column of one data line, or None"""
+    vals = line.decode('utf-8').rstrip('\r\n').split(FD)
+    if index_col >= len(vals): return None
+    try:
+        t = _parse_times(np.array([vals[index_col].strip()], dtype=object))[0]
+    except (ValueError, TypeError):
+        return None
+    return None if np.isnat(t) else t
+
+def _first_time(f, FD, index_col):
+    """Timestamp on the first data line; `f` is at the data offset"""
+    line = f.readline()
+    while line != b'' and line.strip() == b'':
+        line = f.readline()
+    return _line_time(line, FD, index_col) if line else None
+
+def _last_time(f, data_offset, end, FD, index_col, blocksize=2**12):
+    """Timestamp on the last data line, reading backwards from `end`
+
+    A last line that does not parse (e.g. one being written) is skipped.
+    """
+    pos, buf = end, b''
+    while pos > data_offset:
+        step = min(blocksize, pos - data_offset)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        lines = buf.split(b'\n')
+        if pos > data_offset: lines = lines[1:] # may start mid-line
+        for line in reversed(lines):
+            if line.strip() == b'': continue
+            t = _line_time(line, FD, index_col)
+            if t is not None: return t
+        if pos > data_offset: buf = buf[:buf.find(b'\n') + 1]
+    return None
+
+def _scan_file(path, index_col=0, sample=2**16):
+    """Catalog record of one file: header, time extent and row count
+
+    Only the header, the first and the last data line of NEAD text are
+    read; the row count is estimated from the line length in the first
+    `sample` bytes. Binary formats load only the index column.
+    """
+    st = os.stat(path)
+    rec = {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'format': None,
+           'station_id': None, 'timezone': None, 'time_start': None, 'time_end': None,
+           'rows': None, 'rows_exact': None, 'metadata': None, 'error': None}
+    fields = []
+    try:
+        fmt = _file_format(path)
+        t0 = t1 = None
+        if fmt == 'nead':
+            with _open(path) as f:
+                hdr = _parse_header(f)
+                FD, data_offset = hdr.delimiter, hdr.data_offset
+                t0 = _first_time(f, FD, index_col)
+                end = f.seek(0, os.SEEK_END)
+                t1 = _last_time(f, data_offset, end, FD, index_col)
+                f.seek(data_offset)
+                head = f.read(sample)
+            lines = head.count(b'\n') + (0 if head.endswith(b'\n') or head == b'' else 1)
+            exact = data_offset + len(head) >= end
+            rec['rows'] = lines if exact or lines == 0 else \
+                int(round((end - data_offset) * lines / len(head)))
+            rec['rows_exact'] = exact
+        else:
+            hdr = _binary_header(path, fmt)
+            times = read(path, index_col=index_col, variables=[], output='numpy')[hdr.names[index_col]]
+            if len(times):
+                t0, t1 = times[0], times[-1]
+            rec['rows'], rec['rows_exact'] = len(times), True
+        rec.update(format=fmt,
+                   station_id=None if hdr.meta.get('station_id') is None else str(hdr.meta['station_id']),
+                   timezone=None if hdr.meta.get('timezone') is None else str(hdr.meta['timezone']),
+                   time_start=None if t0 is None else str(np.datetime_as_string(t0, unit='s')),
+                   time_end=None if t1 is None else str(np.datetime_as_string(t1, unit='s')),
+                   metadata=_json(hdr.meta))
+        attrs = hdr.field_attrs()
+        for i, name in enumerate(hdr.names):
+            a = {key: arr[i] for key, arr in attrs.items()}
+            fields.append((path, i, name, None if a.get('units') is None else str(a['units']),
+                           _json(a)))
+    except Exception as e:
+        rec['error'] = str(e) or type(e).__name__
+    return rec, fields
+
+def scan(paths, catalog='nead_catalog.sqlite', index_col=0, max_workers=None, prune=True):
+    """Catalog many NEAD files from their headers, without reading the data
+
+    Each file's header is parsed as by `read`. The first and last
+    timestamps come from the first data line and from the last line, found
+    by reading backwards from the end of the file. Records are kept in a
+    SQLite catalog and only files whose size or modification time changed
+    since the previous scan are read again.
+
+    PARAMETERS
+    ----------
+    paths: string or list of strings
+        Paths, or a glob pattern
+
+
+    KEYWORDS
+    --------
+    catalog: string
+        Path of the SQLite catalog, created if missing. ':memory:' keeps
+        nothing between calls.
+    index_col: integer
+        Timestamp column
+    max_workers: integer
+        Threads reading headers. Default as for ThreadPoolExecutor.
+    prune: bool
+        Remove catalog entries of files that no longer exist
+
+    The catalog has two tables, which may be queried directly:
+
+    files: path (absolute), size, mtime_ns, format, station_id, timezone,
+        time_start and time_end (ISO 8601 in file time, to the second;
+        rows are assumed to be in time order), rows (estimated from the
+        length of the first lines of NEAD text, see rows_exact), metadata
+        (the [METADATA] section as JSON), error (why the file could not
+        be scanned, if it could not)
+    fields: path, position, name, units, attrs (the per-field [FIELDS]
+        values as JSON)
+
+    Compressed files are scanned too, but gzip and bzip2 files are
+    decompressed to their end to find the last line.
+
+    RETURNS
+    -------
+    A DataFrame with one row per file in `paths`: the files columns, with
+    time_start and time_end as timestamps, plus lists of field names and
+    units.
+
+    EXAMPLE
+    -------
+    cat = nead.scan('data/**/*.csv')
+    cat[(cat.time_start <= '2019-03-31') & (cat.time_end >= '2019-03-01')
+        & cat.fields.apply(lambda f: 'TA' in f)].station_id.unique()
+    """
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+    if isinstance(paths, (str, Path)):
+        paths = sorted(glob.glob(str(paths), recursive=True))
+    paths = list(dict.fromkeys(os.path.abspath(str(p)) for p in paths))
+
+    db = sqlite3.connect(catalog)
+    try:
+        db.executescript(_CATALOG_SCHEMA)
+        known = dict((r[0], (r[1], r[2])) for r in
+                     db.execute('SELECT path, size, mtime_ns FROM files'))
+        todo = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            if known.get(p) != (st.st_size, st.st_mtime_ns): todo.append(p)
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                scanned = list(pool.map(functools.partial(_scan_file, index_col=index_col), todo))
+            with db:
+                db.executemany('DELETE FROM fields WHERE path = ?', [(p,) for p in todo])
+                db.executemany('INSERT OR REPLACE INTO files VALUES '
+                               '(:path, :size, :mtime_ns, :format, :station_id, :timezone, '
+                               ':time_start, :time_end, :rows, :rows_exact, :metadata, :error)',
+                               [rec for rec, fields in scanned])
+                db.executemany('INSERT INTO fields VALUES (?, ?, ?, ?, ?)',
+                               [f for rec, fields in scanned for f in fields])
+        if prune:
+            gone = [(p,) for p in known.keys() if not os.path.exists(p)]
+            with db:
+                db.executemany('DELETE FROM files WHERE path = ?', gone)
+                db.executemany('DELETE FROM fields WHERE path = ?', gone)
+
+        files = pd.read_sql_query('SELECT * FROM files', db)
+        by_path = {}
+        for path, name, units in db.execute('SELECT path, name, units FROM fields '
+                                            'ORDER BY path, position'):
+            names, all_units = by_path.setdefault(path, ([], []))
+            names.append(name)
+            all_units.append(units)
+    finally:
+        db.close()
+
+    files = files[files['path'].isin(paths)].set_index('path').reindex(
+        [p for p in paths if os.path.exists(p)])
+    files['fields'] = [by_path.get(p, ([], []))[0] for p in files.index]
+    files['units'] = [by_path.get(p, ([], []))[1] for p in files.index]
+    for c in ['time_start', 'time_end']:
+        files[c] = pd.to_datetime(files[c])
+    files['rows'] = files['rows'].astype('Int64')
+    files['rows_exact'] = files['rows_exact'].astype('boolean')
+    return files.reset_index()
+
+def _copy_data(src, dst, start, stop):
+    """Copy bytes [start, stop) of `src` to `dst`
+
+    Uses os.sendfile when both are uncompressed files, so the bytes are
+    copied by the kernel; otherwise copies through 1 MiB buffers.
+    """
+    n = stop - start
+    if hasattr(os, 'sendfile') and all(isinstance(getattr(f, 'raw', None), io.FileIO)
+                                       for f in [src, dst]):
+        dst.flush()
+        try:
+            while n > 0:
+                sent = os.sendfile(dst.fileno(), src.fileno(), start, min(n, 2**30))
+                if sent == 0: break
+                start += sent
+                n -= sent
+        except OSError:
+            pass # e.g. not supported between these files; copy the rest below
+    src.seek(start)
+    while n > 0:
+        buf = src.read(min(n, 2**20))
+        if buf == b'': break
+        dst.write(buf)
+        n -= len(buf)
+
+def _data_range(f, data_offset):
+    """End of the data section of `f`, and whether it ends with a newline"""
+    end = f.seek(0, os.SEEK_END)
+    if end == data_offset: return end, True
+    f.seek(end - 1)
+    return end, f.read(1) == b'\n'
+
+def _check_concat(paths, headers):
+    """Raise ValueError unless the data sections of all files mean the same"""
+    _check_schemas(paths, headers)
+    ref = headers[0]
+    for p, h in zip(paths[1:], headers[1:]):
+        for key in ['station_id', 'field_delimiter', 'nodata', 'timezone']:
+            if str(h.meta.get(key)) != str(ref.meta.get(key)):
+                raise ValueError('{0} {1} in {2} does not match {3} in {4}'.format(
+                    key, h.meta.get(key), p, ref.meta.get(key), paths[0]))
+        for key, arr in h.field_attrs().items():
+            other = ref.field_attrs().get(key)
+            if other is None or [str(_) for _ in arr] != [str(_) for _ in other]:
+                raise ValueError('[FIELDS] {0} in {1} does not match {2}'.format(key, p, paths[0]))
+
+def concat(paths, output_path, sort=True, index_col=0):
+    """Join NEAD text files into one, copying the data sections byte for byte
+
+    The headers must agree: fields, units and every other [FIELDS] entry,
+    and the station_id, field_delimiter, nodata and timezone metadata. The
+    header of the first file is written once, followed by the data lines of
+    each file, which are never parsed, so values keep their exact text.
+
+    PARAMETERS
+    ----------
+    paths: string or list of strings
+        Paths, or a glob pattern
+    output_path: string
+        File to write. Compressed if its suffix is '.gz', '.bz2' or '.zst'.
+
+
+    KEYWORDS
+    --------
+    sort: bool
+        Order the files by the timestamp on their first data line, rather
+        than as given
+    index_col: integer
+        Timestamp column, for `sort`
+
+    RETURNS
+    -------
+    The list of files, in the order they were written.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = sorted(glob.glob(str(paths)))
+    paths = [str(p) for p in paths]
+    if len(paths) == 0: raise ValueError('No files to concatenate')
+    assert(os.path.abspath(str(output_path)) not in [os.path.abspath(p) for p in paths]), \
+        print('Output would overwrite an input: ', output_path)
+    for p in paths:
+        assert(_file_format(p) == 'nead'), print('Only NEAD text files can be concatenated: ', p)
+
+    raw, headers, first = [], [], []
+    for p in paths:
+        with _open(p) as f:
+            raw.append(_read_header_bytes(f))
+            f.seek(0)
+            hdr = _parse_header(f)
+            headers.append(hdr)
+            first.append(_first_time(f, hdr.delimiter, index_col) if sort else None)
+    _check_concat(paths, headers)
+    order = list(range(len(paths)))
+    if sort:
+        never = np.datetime64('2262-01-01') # files without data go last
+        order.sort(key=lambda i: never if first[i] is None else first[i])
+
+    fmt, compression = _output_format(output_path)
+    with _create(output_path, compression) as out:
+        with _stage('write_header', output_path) as st:
+            out.write(raw[order[0]])
+            st.set(nbytes=len(raw[order[0]]))
+        for i in order:
+            with _stage('copy', paths[i]) as st, _open(paths[i]) as f:
+                data_offset = headers[i].data_offset
+                end, newline = _data_range(f, data_offset)
+                _copy_data(f, out, data_offset, end)
+                if not newline: out.write(b'\n')
+                st.set(nbytes=end - data_offset)
+    return [paths[i] for i in order]
+
+_SPLIT_UNITS = {'year': 'Y', 'month': 'M', 'day': 'D'}
+
+def _date_positions(time_format):
+    """Character offsets of %Y, %m and %d at the start of `time_format`
+
+    RETURNS
+    -------
+    A dictionary such as {'Y': (0, 4), 'm': (5, 2), 'd': (8, 2)} for the
+    fixed-width date directives before any other directive.
+    """
+    out, pos, i = {}, 0, 0
+    while time_format is not None and i < len(time_format):
+        if time_format[i] != '%':
+            pos, i = pos + 1, i + 1
+            continue
+        d = time_format[i+1:i+2]
+        if d not in ['Y', 'm', 'd']: break
+        out[d] = (pos, 4 if d == 'Y' else 2)
+        pos, i = pos + out[d][1], i + 2
+    return out
+
+def _line_keys(buf, starts, ends, blank, FD, index_col, unit, positions):
+    """Date of each line at `unit` ('Y', 'M' or 'D') as datetime64
+
+    Reads the date digits in place when the format puts them at fixed
+    offsets (see `_date_positions`); otherwise parses the field as text.
+    Blank lines get NaT.
+    """
+    if index_col == 0 or len(FD) != 1:
+        field = starts if index_col == 0 else None
+    else:
+        delims = np.flatnonzero(buf == ord(FD))
+        i = np.searchsorted(delims, starts) + index_col - 1
+        ok = i < len(delims)
+        field = np.where(ok, delims[np.minimum(i, len(delims) - 1)] + 1, ends)
+    need = {'Y': 'Y', 'M': 'Ym', 'D': 'Ymd'}[unit]
+    if field is not None and all(d in positions for d in need) and len(buf):
+        values = {}
+        valid = ~blank
+        for d in need:
+            pos, width = positions[d]
+            idx = np.minimum(field[:,None] + pos + np.arange(width), len(buf) - 1)
+            digits = buf[idx].astype(np.int64) - ord('0')
+            valid &= np.all((digits >= 0) & (digits <= 9), axis=1) & (field + pos + width <= ends)
+            values[d] = digits @ (10 ** np.arange(width - 1, -1, -1))
+        if np.all(valid | blank):
+            key = ((values['Y'] - 1970) * 12 + (values.get('m', 1) - 1)).astype('datetime64[M]')
+            key = key.astype('datetime64[D]') + (values.get('d', 1) - 1)
+            key = key.astype('datetime64[%s]' % unit)
+            key[blank] = np.datetime64('NaT')
+            return key
+    # General case: decode and parse the index column of each line
+    text = buf.tobytes()
+    vals = np.array([text[a:b].decode('utf-8').rstrip('\r').split(FD)[index_col].strip()
+                     if not bl else '' for a, b, bl in zip(starts, ends, blank)], dtype=object)
+    key = np.full(len(vals), np.datetime64('NaT'), dtype='datetime64[%s]' % unit)
+    key[~blank] = _parse_times(vals[~blank]).astype('datetime64[%s]' % unit)
+    return key
+
+def split(neadfile, by='year', output_path=None, index_col=0, blocksize=2**24):
+    """Split a NEAD text file by calendar period, copying lines byte for byte
+
+    Only the timestamp column is scanned to find where each period starts
+    and ends; each output file is then the original header followed by the
+    data lines of one period, copied without parsing, so values keep their
+    exact text. Periods are in the time of the file (see `timezone`).
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted text file, possibly compressed
+
+
+    KEYWORDS
+    --------
+    by: string
+        'year', 'month' or 'day'
+    output_path: string
+        Output file name with a '{key}' field, e.g. 'out/station_{key}.csv',
+        where key is e.g. '2019', '2019-03' or '2019-03-01'. Default is the
+        input name with '_{key}' before its suffix. Compressed if the suffix
+        is '.gz', '.bz2' or '.zst'.
+    index_col: integer
+        Timestamp column
+    blocksize: integer
+        Bytes scanned at a time
+
+    RETURNS
+    -------
+    A dictionary of the files written, by key.
+    """
+    assert(by in _SPLIT_UNITS), print('Unknown period: ', by, list(_SPLIT_UNITS.keys()))
+    unit = _SPLIT_UNITS[by]
+    assert(_file_format(neadfile) == 'nead'), print('Only NEAD text files can be split: ', neadfile)
+    if output_path is None:
+        p = Path(neadfile)
+        suffix = p.suffix
+        if _output_format(p)[1] is not None: suffix = Path(p.stem).suffix + suffix
+        output_path = str(p.with_name(p.name[:len(p.name) - len(suffix)] + '_{key}' + suffix))
+    assert('{key}' in str(output_path)), print('output_path needs a {key} field: ', output_path)
+
+    # Byte ranges of each period, merging ranges that follow each other
+    ranges = {}
+    with _open(neadfile) as f:
+        raw = _read_header_bytes(f)
+        f.seek(0)
+        hdr = _parse_header(f)
+        FD, data_offset = hdr.delimiter, hdr.data_offset
+        positions = _date_positions(_time_format(f, FD, index_col))
+        end, newline = _data_range(f, data_offset)
+        previous = None
+        with _stage('scan', neadfile) as st:
+            for start, buf, starts, ends, blank in _line_blocks(f, data_offset, blocksize):
+                keys = _line_keys(buf, starts, ends, blank, FD, index_col, unit, positions)
+                bad = np.isnat(keys) & ~blank
+                if bad.any():
+                    raise ValueError('Data line with no valid timestamp at byte {0} of {1}'
+                                     .format(start + starts[np.flatnonzero(bad)[0]], neadfile))
+                # Runs of lines in one period. The runs tile the block, so
+                # blank lines are copied with a neighbouring run.
+                lines = np.flatnonzero(~blank)
+                if len(lines) == 0:
+                    if previous is not None: ranges[previous][-1][1] = start + len(buf)
+                    continue
+                keys = keys[lines]
+                change = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+                lo = start
+                for a, b in zip(np.concatenate([[0], change]), np.concatenate([change, [len(keys)]])):
+                    hi = start + (len(buf) if b == len(keys) else min(int(ends[lines[b-1]]) + 1, len(buf)))
+                    spans = ranges.setdefault(keys[a], [])
+                    if spans and spans[-1][1] == lo: spans[-1][1] = hi
+                    else: spans.append([lo, hi])
+                    lo = hi
+                previous = keys[-1]
+            st.set(nbytes=end - data_offset)
+
+        written = {}
+        compression = _output_format(output_path)[1]
+        for k in sorted(ranges.keys()):
+            label = str(np.datetime_as_string(k))
+            path = str(output_path).format(key=label)
+            with _stage('copy', path) as st, _create(path, compression) as out:
+                out.write(raw)
+                for lo, hi in ranges[k]:
+                    _copy_data(f, out, lo, hi)
+                    if hi == end and not newline: out.write(b'\n')
+                st.set(nbytes=sum(hi - lo for lo, hi in ranges[k]))
+            written[label] = path
+    return written
+
+def _read_text_file(path):
+    """The bytes of a (compressed) NEAD text file, or None for other formats
+
+    Only the first bytes and the header are read to decide, so binary NEAD,
+    Parquet, Feather and NetCDF files are not loaded into memory.
+    """
+    with open(path, 'rb') as f:
+        if _compression(f.read(4)) is None:
+            f.seek(0)
+            if f.read(6) != b'# NEAD': return None
+            f.seek(0)
+            if _is_binary_header(_read_header_bytes(f)): return None
+        f.seek(0)
+        return f.read()
+
+def _write_file(path, raw):
+    with open(path, 'wb') as f:
+        f.write(raw)
+
+def _read_buffer(raw, **kwargs):
+    """`read` from the bytes of a NEAD text file"""
+    return read(BytesIO(raw), **kwargs)
+
+def _write_buffer(data_frame, nead_header, **kwargs):
+    """`write` NEAD text (compressed with `compression`, if given) to bytes"""
+    buf = BytesIO()
+    write(data_frame, nead_header, buf, **kwargs)
+    return buf.getvalue()
+
+async def aread(neadfile, executor=None, **kwargs):
+    """Read a NEAD file without blocking the event loop
+
+    NEAD text (possibly compressed) is read in the loop's default thread
+    pool, then parsed in `executor`. Other formats, decided from the first
+    bytes and the header, and reads with `chunks` or `time_slice` are left
+    to `read` in `executor`, so binary files are memory-mapped, not loaded.
+
+    PARAMETERS
+    ----------
+    file: string
+        Path to NEAD-formatted file
+
+
+    KEYWORDS
+    --------
+    executor: concurrent.futures.Executor
+        Where to parse. Default is the loop's default thread pool. A
+        ProcessPoolExecutor parses several files at once on multi-core hosts.
+    kwargs:
+        Passed to `read`
+
+    RETURNS
+    -------
+    The result of `read`.
+    """
+    loop = asyncio.get_running_loop()
+    neadfile = str(neadfile)
+    if kwargs.get('chunks') is None and kwargs.get('time_slice') is None:
+        raw = await loop.run_in_executor(None, _read_text_file, neadfile)
+        if raw is not None:
+            return await loop.run_in_executor(executor,
+                                              functools.partial(_read_buffer, raw, **kwargs))
+    return await loop.run_in_executor(executor, functools.partial(read, neadfile, **kwargs))
+
+async def awrite(data_frame, nead_header, output_path, executor=None, **kwargs):
+    """Write a NEAD file without blocking the event loop
+
+    NEAD text is formatted in `executor` and written to disk in the loop's
+    default thread pool. Other formats are written entirely in `executor`.
+
+    PARAMETERS, KEYWORDS
+    --------------------
+    As for `write`, plus `executor` as for `aread`
+    """
+    loop = asyncio.get_running_loop()
+    output_path = str(output_path)
+    format, compression = _output_format(output_path)
+    format = kwargs.get('format') or format
+    if format != 'nead':
+        await loop.run_in_executor(executor, functools.partial(
+            write, data_frame, nead_header, output_path, **kwargs))
+        return
+    # Compress in `executor` too, so the loop's thread pool only writes bytes
+    kwargs.setdefault('compression', compression)
+    raw = await loop.run_in_executor(executor, functools.partial(
+        _write_buffer, data_frame, nead_header, **kwargs))
+    await loop.run_in_executor(None, _write_file, output_path, raw)
+
+async def aread_many(paths, limit=16, executor=None, return_exceptions=False, **kwargs):
+    """Read many NEAD files concurrently, yielding each as it completes
+
+    At most `limit` files are read (and held in memory as bytes) at a time.
+
+    PARAMETERS
+    ----------
+    paths: string or list of strings
+        Paths, or a glob pattern
+
+
+    KEYWORDS
+    --------
+    limit: integer
+        Maximum number of files in flight
+    executor: concurrent.futures.Executor
+        Where to parse, as for `aread`
+    return_exceptions: bool
+        Yield (path, exception) for files that fail instead of raising
+    kwargs:
+        Passed to `read`
+
+    RETURNS
+    -------
+    An async generator of (path, result) tuples, in order of completion.
+
+    EXAMPLE
+    -------
+    async for path, ds in nead.aread_many('data/*.csv', limit=32, index_col=0):
+        ...
+    """
+    if isinstance(paths, (str, Path)):
+        paths = sorted(glob.glob(str(paths)))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def one(path):
+        async with semaphore:
+            try:
+                return path, await aread(path, executor=executor, **kwargs)
+            except Exception as e:
+                if not return_exceptions: raise
+                return path, e
+
+    tasks = [asyncio.ensure_future(one(str(p))) for p in paths]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks: task.cancel()
+
 def read_header(header_path: str):
 # Writes NEAD file (CSV file with NEAD formatted header)
 # Columns written in NEAD output will be the fields designated in the
@@ -158,9 +2306,98 @@ def get_hashed_lines(header):
     return hash_lines
 
 
-def write(data_frame, nead_header, output_path):
+def _header_bytes(conf):
+    """Render a header ConfigParser as '# '-prefixed NEAD header bytes"""
+    lines = ['# NEAD 1.0 UTF-8\n']
+    for section in conf.sections():
+        lines.append('# [' + section + ']\n')
+        for key, val in conf.items(section, raw=True):
+            if val is None:
+                lines.append('# ' + key + '\n')
+            else:
+                lines.append('# ' + key + ' = ' + str(val).replace('\n', ' ') + '\n')
+    return ''.join(lines).encode('utf-8')
+
+def _float_formats(fields_list, float_format='%.2f', precision=None):
+    """Resolve float_format and precision into a default and per-field formats"""
+    default, formats = float_format, {}
+    if isinstance(float_format, dict):
+        default, formats = '%.2f', dict(float_format)
+    if isinstance(precision, dict):
+        formats.update({k: '%.{0}f'.format(v) for k,v in precision.items()})
+    elif precision is not None:
+        default = '%.{0}f'.format(precision)
+    for k in formats.keys():
+        assert(k in fields_list), print('Unknown field: ', k)
+    return default, formats
+
+def _write_rows(f, df, fields_list, default, formats, chunksize=None, sep=','):
+    """Append the rows of `df` to the binary handle `f` as delimited text"""
+    df = df[fields_list]
+    formats = {k: v for k,v in formats.items()
+               if v != default and df[k].dtype.kind == 'f'}
+    if formats:
+        # Render fields with their own format; the rest use `default`
+        df = df.copy()
+        for k, fmt in formats.items():
+            vals = df[k].values
+            strs = np.char.mod(fmt, vals).astype(object)
+            strs[np.isnan(vals)] = ''
+            df[k] = strs
+    df.to_csv(f,
+              sep=sep,
+              mode='wb',
+              encoding='utf-8',
+              index=False,
+              header=False,
+              float_format=default,
+              chunksize=chunksize,
+              lineterminator='\n')
+
+def write(data_frame, nead_header, output_path, format=None, float_format='%.2f',
+          precision=None, chunksize=None, compression=None):
+    """Write a NEAD file
+
+    PARAMETERS
+    ----------
+    data_frame: pandas DataFrame, or an iterable of DataFrames
+        Data with one column per header field. An iterable (e.g. from
+        `iter_chunks(..., output='pandas')` after `reset_index`) is streamed
+        to disk one DataFrame at a time.
+    nead_header: string or ConfigParser
+        Path to a header .ini file, or a header object from `build_header_obj`
+    output_path: string or file object
+        Path of the file to write, or a binary file object (e.g. BytesIO) to
+        write NEAD text to
+
+
+    KEYWORDS
+    --------
+    format: string
+        'nead', 'parquet', 'feather', 'netcdf' or 'nead-binary'. Default from
+        the suffix of `output_path`, else 'nead'. 'nead-binary' keeps the NEAD
+        text header but stores each field as a block of little-endian values
+        that `read` memory-maps; see `database_fields_data_types` in its
+        header. nodata values are stored as nan.
+    float_format: string or dict
+        printf-style format for float fields, None for full precision, or a
+        dictionary of per-field formats. NEAD text only.
+    precision: integer or dict
+        Decimal places for all float fields, or per field. Overrides
+        float_format. NEAD text only.
+    chunksize: integer
+        Rows written per batch.
+    compression: string
+        'gzip', 'bz2' or 'zstd' to compress NEAD text. Default from the
+        suffix of `output_path` ('.gz', '.bz2', '.zst'), else none. zstd files
+        are written in the zstd seekable format: independent frames of about
+        1 MB of whole lines, and a seek table that lets `read` decompress only
+        the frames a chunk, time slice or tail needs.
+    """
+    is_file = hasattr(output_path, 'write')
+    label = getattr(output_path, 'name', None) if is_file else output_path
     # Assign nead_output to output_path with .csv extension
-    nead_output = Path('{0}'.format(output_path))
+    nead_output = output_path if is_file else Path('{0}'.format(output_path))
 
     # Read nead_header into conf
     if isinstance(nead_header, str):
@@ -169,31 +2406,539 @@ def write(data_frame, nead_header, output_path):
         conf = nead_header
 
     # Assign fields from nead_header 'fields', convert to list in fields_list
+    FD = conf.get('METADATA', 'field_delimiter', fallback=',') or ','
     fields =conf.get('FIELDS', 'fields')
-    fields_list = fields.replace(" ", "").split(',')
-
-    # Write conf into buffer
-    buffer = StringIO()
-    conf.write(buffer)
-
-    # Assign hash_lines with nead_header lines prepended with '# '
-    hash_lines = get_hashed_lines(buffer.getvalue())
-
-    # Write hash_lines into nead_header
-    nead_header = codecs.open(nead_output, "w", "utf-8")
-    nead_header.write('# NEAD 1.0 UTF-8\n')
-    for row in hash_lines:
-        nead_header.write(row)
-    nead_header.close()
-    # Append data to header, omit indices, omit dataframe header, and output columns in fields_list
-    with open(nead_output, 'a') as nead:
-        data_frame.to_csv(nead, 
-                          index=False,
-                          header=False,
-                          columns=fields_list,
-                          float_format='%.2f',
-                          lineterminator='\n')
+    fields_list = fields.replace(" ", "").split(FD)
+
+    frames = [data_frame] if isinstance(data_frame, pd.DataFrame) else data_frame
+
+    # Binary formats keep the header as file and column metadata.
+    suffix_format, suffix_compression = (None, None) if is_file else _output_format(nead_output)
+    if format is None: format = suffix_format or 'nead'
+    if compression is None: compression = suffix_compression
+    if format != 'nead':
+        assert(not is_file), print(format, ' output needs a path, not a file object')
+        assert(compression is None), print('Only NEAD text files can be compressed')
+        with _stage('write_binary', output_path) as st:
+            _write_binary((df[fields_list] for df in frames), conf, nead_output, format)
+            st.set(nbytes=os.path.getsize(nead_output))
+        return
+
+    default, formats = _float_formats(fields_list, float_format, precision)
+
+    # One buffered handle for the header and all rows
+    with _create(nead_output, compression) as nead:
+        with _stage('write_header', label) as st:
+            nead.write(_header_bytes(conf))
+            st.set(nbytes=nead.tell())
+        for df in frames:
+            with _stage('write_rows', label) as st:
+                start = nead.tell()
+                _write_rows(nead, df, fields_list, default, formats, chunksize, FD)
+                st.set(rows=len(df), nbytes=nead.tell() - start)
+
+
+# Compressed NEAD text. Readers see a seekable handle on the decompressed
+# bytes, so data_offset, block ranges, sidecar index offsets and tail offsets
+# all count decompressed bytes.
+_COMPRESSION_MAGIC = [(b'\x1f\x8b', 'gzip'),
+                      (b'BZh', 'bz2'),
+                      (b'\x28\xb5\x2f\xfd', 'zstd')]
+
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip',
+                         '.bz2': 'bz2',
+                         '.zst': 'zstd',
+                         '.zstd': 'zstd'}
+
+def _compression(magic):
+    """'gzip', 'bz2', 'zstd' or None, from the first bytes of a file"""
+    for m, name in _COMPRESSION_MAGIC:
+        if magic.startswith(m): return name
+    return None
+
+def _open(neadfile):
+    """Open a NEAD file for reading, decompressing it if needed
+
+    PARAMETERS
+    ----------
+    file: string or file object
+        Path, or a seekable binary file object positioned at the start of
+        the file. A file object is not closed with the returned handle.
+
+    RETURNS
+    -------
+    A context manager giving a seekable binary file object, whose offsets
+    are into the decompressed bytes.
+    """
+    if hasattr(neadfile, 'read'):
+        pos = neadfile.tell()
+        compression = _compression(neadfile.read(4))
+        neadfile.seek(pos)
+        if compression is None: return contextlib.nullcontext(neadfile)
+        src, close = neadfile, False
+    else:
+        f = open(neadfile, 'rb')
+        compression = _compression(f.read(4))
+        f.seek(0)
+        if compression is None: return f
+        src, close = f, True
+    if compression == 'zstd':
+        return io.BufferedReader(_ZstdReader(src, close=close), buffer_size=2**16)
+    module = gzip if compression == 'gzip' else bz2
+    if not close: return module.open(src, 'rb')
+    src.close()
+    return module.open(neadfile, 'rb')
+
+def _output_format(path):
+    """(format, compression) of an output path, from its suffixes"""
+    path = Path(path)
+    compression = _COMPRESSION_SUFFIXES.get(path.suffix.lower())
+    if compression is not None: path = Path(path.stem)
+    return _BINARY_SUFFIXES.get(path.suffix.lower(), 'nead'), compression
+
+def _create(output, compression=None):
+    """Open a path, or wrap a binary file object, for writing NEAD text
+
+    A file object is not closed with the returned handle.
+    """
+    assert(compression in [None, 'gzip', 'bz2', 'zstd']), print('Unknown compression: ', compression)
+    is_file = hasattr(output, 'write')
+    if compression == 'gzip': return gzip.open(output, 'wb', compresslevel=6)
+    if compression == 'bz2': return bz2.open(output, 'wb')
+    if compression == 'zstd':
+        return _ZstdWriter(output if is_file else open(output, 'wb'), close=not is_file)
+    return contextlib.nullcontext(output) if is_file else open(output, 'wb', buffering=2**20)
+
+# zstd files are written in the zstd seekable format: independent frames of
+# about _ZSTD_FRAME_SIZE uncompressed bytes, cut at line ends, followed by a
+# skippable frame holding the compressed and decompressed size of each frame.
+# Other zstd tools decompress these files as usual.
+_ZSTD_FRAME_SIZE = 2**20
+_ZSTD_SKIPPABLE_MAGIC = 0x184D2A5E
+_ZSTD_SEEKABLE_MAGIC = 0x8F92EAB1
+
+def _zstd_seek_table(f):
+    """Compressed and decompressed frame offsets of a seekable zstd file
+
+    RETURNS
+    -------
+    Two arrays of len(frames) + 1 offsets, or None if `f` has no seek table.
+    """
+    end = f.seek(0, os.SEEK_END)
+    if end < 17: return None
+    f.seek(end - 9)
+    n, descriptor, magic = struct.unpack('<IBI', f.read(9))
+    if magic != _ZSTD_SEEKABLE_MAGIC: return None
+    entry = 12 if descriptor & 0x80 else 8 # optional per-frame checksums
+    size = n * entry + 9
+    if end < size + 8: return None
+    f.seek(end - size - 8)
+    skippable, frame_size = struct.unpack('<II', f.read(8))
+    if skippable != _ZSTD_SKIPPABLE_MAGIC or frame_size != size: return None
+    table = np.frombuffer(f.read(n * entry), dtype='<u4').reshape(n, entry // 4)
+    offsets = [np.concatenate([[0], np.cumsum(table[:,i], dtype=np.int64)]) for i in [0, 1]]
+    return offsets[0], offsets[1]
+
+class _ZstdReader(io.RawIOBase):
+    """Seekable view of the decompressed bytes of a zstd file
+
+    With a seek table, a read decompresses only the frame holding the
+    current position. Other zstd files are decompressed as a stream, and a
+    backward seek restarts it from the beginning.
+    """
+    def __init__(self, f, close=True):
+        import zstandard
+        self._f = f
+        self._close = close
+        self._start = f.tell()
+        self._dctx = zstandard.ZstdDecompressor()
+        self._table = _zstd_seek_table(f)
+        self._frame = (None, b'')
+        self._stream, self._stream_pos = None, 0
+        self._size = None if self._table is None else int(self._table[1][-1])
+        self._pos = 0
+        self.name = getattr(f, 'name', None)
+
+    def readable(self): return True
+    def seekable(self): return True
+    def fileno(self): return self._f.fileno()
+    def tell(self): return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR: offset += self._pos
+        elif whence == os.SEEK_END:
+            if self._size is None:
+                while self._read_stream(self._stream_pos, 2**20): pass
+            offset += self._size
+        if offset < 0: raise ValueError('negative seek position')
+        self._pos = offset
+        return offset
+
+    def readinto(self, b):
+        if self._table is None:
+            data = self._read_stream(self._pos, len(b))
+        else:
+            data = self._read_frame(self._pos, len(b))
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def _read_frame(self, pos, n):
+        coffsets, doffsets = self._table
+        i = int(np.searchsorted(doffsets, pos, side='right')) - 1
+        if i >= len(doffsets) - 1: return b''
+        if self._frame[0] != i:
+            self._f.seek(self._start + int(coffsets[i]))
+            raw = self._f.read(int(coffsets[i+1] - coffsets[i]))
+            self._frame = (i, self._dctx.decompress(
+                raw, max_output_size=int(doffsets[i+1] - doffsets[i])))
+        start = pos - int(doffsets[i])
+        return self._frame[1][start:start + n]
+
+    def _read_stream(self, pos, n):
+        if self._stream is None or self._stream_pos > pos:
+            self._f.seek(self._start)
+            self._stream = self._dctx.stream_reader(self._f, read_across_frames=True,
+                                                    closefd=False)
+            self._stream_pos = 0
+        while self._stream_pos < pos:
+            skipped = len(self._stream.read(min(pos - self._stream_pos, 2**20)))
+            if skipped == 0:
+                self._size = self._stream_pos
+                return b''
+            self._stream_pos += skipped
+        data = self._stream.read(n)
+        self._stream_pos += len(data)
+        if n > 0 and len(data) == 0: self._size = self._stream_pos
+        return data
+
+    def close(self):
+        if not self.closed and self._close: self._f.close()
+        super().close()
+
+class _ZstdWriter(io.RawIOBase):
+    """Write the zstd seekable format to the binary handle `f`"""
+    def __init__(self, f, close=True, frame_size=None, level=3):
+        import zstandard
+        self._f = f
+        self._close = close
+        self._cctx = zstandard.ZstdCompressor(level=level, write_checksum=True)
+        self._frame_size = frame_size or _ZSTD_FRAME_SIZE
+        self._buf = bytearray()
+        self._frames = []
+        self._pos = 0
+        self.name = getattr(f, 'name', None)
+
+    def writable(self): return True
+    def tell(self): return self._pos
+
+    def write(self, b):
+        n = len(self._buf)
+        self._buf += b
+        n = len(self._buf) - n
+        self._pos += n
+        while len(self._buf) >= self._frame_size:
+            # End frames at a line end, so that frames hold whole rows
+            cut = self._buf.rfind(b'\n', 0, self._frame_size) + 1
+            if cut == 0: cut = self._buf.find(b'\n', self._frame_size) + 1
+            if cut == 0: break
+            self._write_frame(self._buf[:cut])
+            del self._buf[:cut]
+        return n
+
+    def _write_frame(self, data):
+        raw = self._cctx.compress(bytes(data))
+        self._f.write(raw)
+        self._frames.append((len(raw), len(data)))
+
+    def close(self):
+        if self.closed: return
+        try:
+            if self._buf or not self._frames: self._write_frame(self._buf)
+            table = b''.join(struct.pack('<II', *fr) for fr in self._frames)
+            table += struct.pack('<IBI', len(self._frames), 0, _ZSTD_SEEKABLE_MAGIC)
+            self._f.write(struct.pack('<II', _ZSTD_SKIPPABLE_MAGIC, len(table)) + table)
+        finally:
+            if self._close: self._f.close()
+            super().close()
+
+_BINARY_SUFFIXES = {'.parquet': 'parquet',
+                    '.pq': 'parquet',
+                    '.feather': 'feather',
+                    '.arrow': 'feather',
+                    '.nc': 'netcdf'}
+
+def _file_format(path):
+    """Detect the format of a file from its first bytes
+
+    RETURNS
+    -------
+    'parquet', 'feather', 'netcdf', 'nead-binary' or 'nead'. Compressed
+    files must be NEAD text.
+    """
+    with open(path, 'rb') as f:
+        fmt = _columnar_format(f)
+        if fmt != 'nead': return fmt
+        compressed = _compression(f.read(4)) is not None
+        f.seek(0)
+        with _open(f) as g:
+            binary = _is_binary_header(_read_header_bytes(g))
+    assert(not (compressed and binary)), print('Only NEAD text files can be compressed: ', path)
+    return 'nead-binary' if binary else 'nead'
+
+def _columnar_format(f):
+    """'parquet', 'feather' or 'netcdf' from the first bytes of `f`, else 'nead'
+
+    Restores the position of `f`.
+    """
+    pos = f.tell()
+    magic = f.read(8)
+    f.seek(pos)
+    if magic.startswith(b'PAR1'): return 'parquet'
+    if magic.startswith(b'ARROW1'): return 'feather'
+    if magic.startswith(b'CDF') or magic.startswith(b'\x89HDF'): return 'netcdf'
+    return 'nead'
+
+def _is_binary_header(raw):
+    """True if raw header bytes declare a binary data section
+
+    A raw scan, so that the header is parsed (and cached) only once.
+    """
+    return re.search(rb'^#\s*data_format\s*=\s*binary\s*$', raw, re.M) is not None
+
+# Binary NEAD: the text header, then one little-endian block per field, each
+# starting on a multiple of _ALIGN bytes so that it can be memory-mapped.
+_ALIGN = 64
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _binary_dtype(t):
+    """numpy dtype of a binary NEAD block from its database_fields_data_types entry"""
+    t = str(t).strip().lower()
+    if t == 'timestamp': return np.dtype('<M8[ns]')
+    dt = np.dtype(t)
+    assert(dt.kind in 'iuf'), print('Unsupported binary field type: ', t)
+    return dt.newbyteorder('<')
 
+def _binary_blocks(f, hdr):
+    """Byte offset, dtype and row count of each field block of a binary NEAD file
+
+    The blocks start at the first multiple of _ALIGN after the "# [DATA]"
+    line and a padding comment line.
+    """
+    f.seek(0)
+    while f.readline().rstrip(b'\r\n') != b'# [DATA]':
+        pass
+    offset = _aligned(f.tell() + 2)
+    rows = int(hdr.meta['row_count'])
+    types = hdr.fields['database_fields_data_types'].split(hdr.delimiter)
+    blocks = []
+    for t in types:
+        dt = _binary_dtype(t)
+        blocks.append((offset, dt, rows))
+        offset = _aligned(offset + rows * dt.itemsize)
+    return blocks
+
+def _binary_columns(frames, nodata=None):
+    """Column arrays and type names for a binary NEAD data section
+
+    Text columns must hold timestamps. `nodata` is replaced by nan, and
+    integer fields holding it become float64, so the stored blocks never
+    need masking.
+    """
+    df = pd.concat(list(frames), ignore_index=True)
+    if isinstance(nodata, bool) or not isinstance(nodata, (int, float, np.number)):
+        nodata = None
+    columns, types = {}, []
+    for n in df.columns:
+        values = df[n].values
+        if values.dtype.kind == 'b': values = values.astype(np.uint8)
+        if values.dtype.kind not in 'iufM':
+            try:
+                values = _parse_times(np.asarray(values, dtype=object))
+            except (ValueError, TypeError):
+                assert(False), print('Binary NEAD holds numbers and timestamps only: ', n)
+        if values.dtype.kind == 'M':
+            values = values.astype('<M8[ns]')
+            types.append('timestamp')
+        else:
+            if nodata is not None and not np.isnan(nodata):
+                mask = values == nodata
+                if mask.any():
+                    values = values.astype(values.dtype if values.dtype.kind == 'f' else np.float64)
+                    values[mask] = np.nan
+            values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+            types.append(values.dtype.name)
+        columns[n] = values
+    return columns, types
+
+def _write_nead_binary(frames, conf, path):
+    """Write DataFrames as a binary NEAD file: text header, aligned column blocks"""
+    sections = _conf_sections(conf)
+    FD = sections['METADATA'].get('field_delimiter', ',')
+    columns, types = _binary_columns(frames, _typed_value(sections['METADATA'].get('nodata', '')))
+    rows = len(next(iter(columns.values()))) if columns else 0
+    out = configparser.ConfigParser(interpolation=None)
+    out['METADATA'] = dict(sections['METADATA'], data_format='binary', row_count=str(rows))
+    out['FIELDS'] = dict(sections['FIELDS'], database_fields_data_types=FD.join(types))
+    out['DATA'] = {}
+    header = _header_bytes(out)
+    offset = _aligned(len(header) + 2)
+    with open(path, 'wb', buffering=2**20) as f:
+        f.write(header)
+        f.write(b'#' + b' ' * (offset - len(header) - 2) + b'\n')
+        for values in columns.values():
+            buf = values.view(np.uint8) if values.size else b''
+            f.write(buf)
+            f.write(b'\0' * (_aligned(offset + len(buf)) - offset - len(buf)))
+            offset = _aligned(offset + len(buf))
+
+def _read_nead_binary(path, columns, f=None, hdr=None):
+    """Memory-map `columns` of a binary NEAD file
+
+    `f` and `hdr` are an open handle on `path` and its parsed header, if
+    already read.
+
+    RETURNS
+    -------
+    A dataset with an 'index' dimension whose variables are read-only views
+    of the file; pages are loaded when the values are used.
+    """
+    if f is None:
+        with open(path, 'rb') as f:
+            return _read_nead_binary(path, columns, f, _parse_header(f))
+    blocks = dict(zip(hdr.names, _binary_blocks(f, hdr)))
+    data_vars = {}
+    for n in columns:
+        offset, dt, rows = blocks[n]
+        mm = np.memmap(path, dtype=dt, mode='r', offset=offset, shape=(rows,)) if rows \
+            else np.array([], dtype=dt)
+        data_vars[n] = ('index', mm)
+    rows = int(hdr.meta['row_count'])
+    return xr.Dataset(data_vars, coords={'index': np.arange(rows)})
+
+def _conf_sections(conf):
+    """The [METADATA] and [FIELDS] sections of a header as dicts of strings"""
+    return {'METADATA': {k: str(v) for k,v in conf['METADATA'].items()},
+            'FIELDS': {k: str(v) for k,v in conf['FIELDS'].items()}}
+
+def _per_field(sections, names):
+    """Per-field header strings: {name: {key: value}}"""
+    FD = sections['METADATA'].get('field_delimiter', ',')
+    out = {n: {} for n in names}
+    for key, val in sections['FIELDS'].items():
+        if key == 'fields': continue
+        for n, v in zip(names, val.split(FD)):
+            out[n][key] = v.strip()
+    return out
+
+def _write_binary(frames, conf, path, format):
+    """Write DataFrames and their NEAD header to a binary columnar file
+
+    Parquet and Feather are written one DataFrame at a time.
+    """
+    sections = _conf_sections(conf)
+    if format in ['parquet', 'feather']:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for df in frames:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    per_field = _per_field(sections, list(df.columns))
+                    schema = pa.schema([table.schema.field(n).with_metadata(per_field[n])
+                                        for n in table.schema.names],
+                                       metadata={'nead': json.dumps(sections)})
+                    if format == 'parquet':
+                        writer = pq.ParquetWriter(path, schema)
+                    else:
+                        writer = pa.ipc.new_file(str(path), schema)
+                writer.write_table(table.cast(schema))
+        finally:
+            if writer is not None: writer.close()
+    elif format == 'nead-binary':
+        _write_nead_binary(frames, conf, path)
+    elif format == 'netcdf':
+        df = pd.concat(list(frames), ignore_index=True)
+        per_field = _per_field(sections, list(df.columns))
+        ds = xr.Dataset({n: ('index', _netcdf_values(df[n])) for n in df.columns},
+                        coords={'index': np.arange(len(df))})
+        ds.attrs = dict(sections['METADATA'])
+        ds.attrs['nead_header'] = json.dumps(sections)
+        for n in df.columns:
+            # Prefixed so that readers do not apply NEAD strings such as
+            # scale_factor as CF attributes; nead_header holds the header
+            ds[n].attrs = {'nead_' + k: v for k,v in per_field[n].items()}
+        ds.to_netcdf(path)
+    else:
+        assert(False), print('Unknown format: ', format)
+
+def _netcdf_values(col):
+    """A column as a numpy array NetCDF can store
+
+    Text columns holding timestamps (as `_binary_columns` parses them)
+    become datetime64; other text is stored as strings.
+    """
+    values = col.values
+    if values.dtype.kind in 'iufbM': return values
+    values = col.to_numpy(dtype=object)
+    try:
+        return _parse_times(values)
+    except (ValueError, TypeError):
+        return values.astype(str)
+
+def _binary_header(path, format, hdr=None):
+    """Rebuild the NeadHeader stored in a binary columnar file
+
+    `hdr` is the parsed header of a binary NEAD file, if already read.
+    """
+    if format == 'nead-binary':
+        if hdr is None:
+            with open(path, 'rb') as f:
+                hdr = _parse_header(f)
+        # Layout keys describe the file, not the data
+        meta = {k: v for k,v in hdr.meta.items() if k not in ['data_format', 'row_count']}
+        return NeadHeader(meta, dict(hdr.fields, fields=hdr.delimiter.join(hdr.names)),
+                          hdr.data_offset)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        raw = pq.read_schema(path).metadata[b'nead']
+    elif format == 'feather':
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            raw = pa.ipc.open_file(source).schema.metadata[b'nead']
+    else:
+        with xr.open_dataset(path, decode_cf=False) as ds:
+            raw = ds.attrs['nead_header']
+    sections = json.loads(raw)
+    meta = {k: _typed_value(v) for k,v in sections['METADATA'].items()}
+    return NeadHeader(meta, sections['FIELDS'], 0)
+
+def _read_binary(path, format, columns, f=None, hdr=None):
+    """Load `columns` from a binary columnar file without text parsing
+
+    For binary NEAD, `f` and `hdr` are an open handle and its parsed header,
+    if already read.
+
+    RETURNS
+    -------
+    A DataFrame, or for NetCDF and binary NEAD a dataset with an 'index'
+    dimension.
+    """
+    if format == 'nead-binary':
+        return _read_nead_binary(path, columns, f, hdr)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns).to_pandas()
+    if format == 'feather':
+        import pyarrow.feather as feather
+        return feather.read_feather(path, columns=columns)
+    with xr.open_dataset(path, mask_and_scale=False) as ds:
+        ds = ds[columns].load()
+    for v in ds.data_vars: ds[v].attrs = {}
+    return ds
 
 def write_header(header_file_name, df,  metadata = ('metadata_name', 'metadata_value'),
                 fields = '', add_value = '', scale_factor = '', units = '',
@@ -1,5 +1,11 @@
+import contextlib
+import gzip
+import io
+import os
+
 import pytest
 import numpy as np
+import pandas as pd
 
 
 import nead
@@ -14,6 +20,666 @@ def test_read_attrs():
     ds = nead.read(fname, index_col=0, MKS=True)
     assert(ds['RH'].scale_factor == 0.01)
     
+def test_data_offset():
+    with open(fname, 'rb') as f:
+        hdr = nead.nead._parse_header(f)
+        assert(f.tell() == hdr.data_offset)
+        assert(f.readline().startswith(b'2010-06-22T12:00:00'))
+    assert(hdr.meta['field_delimiter'] == ',')
+    assert(hdr.names == ['timestamp', 'TA', 'RH', 'VW', 'ISWR'])
+
+def test_header_blank_line(tmp_path):
+    path = str(tmp_path / 'blank.csv')
+    with open(fname) as f:
+        s = f.read()
+    with open(path, 'w') as f:
+        f.write(s.replace('# [FIELDS]', '\n# [FIELDS]'))
+    ds = nead.read(path, MKS=True)
+    assert(ds.equals(nead.read(fname, MKS=True)))
+    assert(ds.attrs == nead.read(fname).attrs)
+
+def test_header_typing():
+    assert(nead.nead._typed_value('1e-3') == 0.001)
+    assert(nead.nead._typed_value('-.5') == -0.5)
+    assert(nead.nead._typed_value('+01') == 1)
+    assert(np.isnan(nead.nead._typed_value('nan')))
+    assert(nead.nead._typed_value('test_station') == 'test_station')
+    arr = nead.nead._typed_values(['1', '1e-3', 'nan', ''])
+    assert(arr.dtype == float and np.isnan(arr[3]))
+    assert(nead.nead._typed_values(['0', '1']).dtype.kind == 'i')
+    assert(nead.nead._typed_values(['K', '1']) == ['K', '1'])
+
+def test_header_field_attrs_cached():
+    with open(fname, 'rb') as f:
+        hdr = nead.nead._parse_header(f)
+    attrs = hdr.field_attrs()
+    assert(attrs['scale_factor'][2] == 0.01)
+    assert(hdr.field_attrs([2])['scale_factor'][0] == 0.01)
+    assert(hdr._typed['scale_factor'] is attrs['scale_factor'])
+
+def test_header_cache(tmp_path):
+    nead.header_cache.clear()
+    nead.read(fname)
+    nead.read(fname, index_col=0)
+    assert(nead.header_cache.misses == 1)
+    assert(nead.header_cache.hits == 1)
+
+    # appending rows keeps the header version
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=5)
+    nead.read(path)
+    with open(path, 'a') as f:
+        f.write('2010-01-01T05:00:00,1.0,1,1.0,1.0\n')
+    assert(nead.read(path).sizes['index'] == 6)
+    assert(nead.header_cache.hits == 2)
+
+    nead.header_cache.maxsize = 1
+    assert(len(nead.header_cache) == 1)
+    nead.header_cache.maxsize = 256
+    nead.header_cache.clear()
+    assert(len(nead.header_cache) == 0 and nead.header_cache.hits == 0)
+
+def test_nodata_mask_and_scale(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    df = make_nead(path, rows=4)
+    df.loc[1, 'TA'] = -999
+    df.loc[2, 'ISWR'] = -999
+    nead.write(df, 'sample_header.ini', path, float_format=None)
+    ds = nead.read(path, index_col=0, MKS=True)
+    assert(np.isnan(ds['TA'].values[1]))
+    assert(np.isnan(ds['ISWR'].values[2]))
+    assert(ds['TA'].values[0] == -10 + 273.15)
+    ds = nead.read(path, index_col=0)
+    assert(ds['RH'].dtype.kind == 'i')
+    assert(ds['timestamp'].dtype.kind == 'M')
+
+    # float columns are masked and scaled in the parsed buffers
+    with open(path, 'rb') as f:
+        hdr = nead.nead._parse_header(f)
+        df = nead.nead._read_csv(f, hdr.names, hdr.delimiter, list(range(5)))
+    buf = df['TA'].to_numpy()
+    out = nead.nead._to_dataset(df, hdr.meta, hdr.field_attrs(), MKS=True, output='numpy')
+    assert(np.shares_memory(out['TA'], buf))
+    assert(np.isnan(out['TA'][1]) and out['TA'][0] == -10 + 273.15)
+
+def test_read_compact(tmp_path):
+    df = make_nead(str(tmp_path / 'a.csv'), rows=10)
+    nead.write_header(str(tmp_path / 'header.ini'), df,
+                      metadata = {'station_id': 'test', 'nodata': -999, 'field_delimiter': ','},
+                      units = ['time', 'C', 'perc', 'ms-1', 'Wm-2'])
+    path = str(tmp_path / 'b.csv')
+    nead.write(df, str(tmp_path / 'header.ini'), path)
+    types = nead.nead._header_of(path).field_attrs()['database_fields_data_types']
+    assert(list(types) == ['timestamp', 'float64', 'int64', 'float64', 'float64'])
+
+    ds = nead.read(path, index_col=0, dtype='compact')
+    assert(ds['TA'].dtype == np.float32)
+    assert(ds['RH'].dtype == np.int64) # declared int64; never narrowed by value
+    assert(ds['timestamp'].dtype.kind == 'M')
+    ds = nead.read(path, index_col=0, MKS=True, dtype='compact')
+    assert(ds['TA'].dtype == np.float32 and ds['RH'].dtype == np.int64)
+    ds = nead.read(path, index_col=0, dtype={'VW': 'float32'})
+    assert(ds['VW'].dtype == np.float32 and ds['TA'].dtype == np.float64)
+
+    # nodata and empty values in fields declared as narrow integers
+    header = open(path).read().split('# [DATA]\n')[0]
+    assert('timestamp,float64,int64,float64,float64' in header)
+    header = header.replace('timestamp,float64,int64,float64,float64',
+                            'timestamp,float64,int8,integer,float64')
+    path = str(tmp_path / 'c.csv')
+    with open(path, 'w') as f:
+        f.write(header + '# [DATA]\n'
+                '2010-01-01T00:00:00,1.0,50,5,1.0\n'
+                '2010-01-01T01:00:00,2.0,-999,,1.0\n'
+                '2010-01-01T02:00:00,3.0,60,7,1.0\n')
+    ds = nead.read(path, index_col=0, dtype='compact')
+    assert(ds['RH'].dtype == np.float32 and ds['VW'].dtype == np.float32)
+    assert(np.array_equal(ds['RH'].values, [50, np.nan, 60], equal_nan=True))
+    assert(np.array_equal(ds['VW'].values, [5, np.nan, 7], equal_nan=True))
+    assert(np.array_equal(ds['RH'].values, nead.read(path, index_col=0)['RH'].values, equal_nan=True))
+
+    # the declared width, the same in every chunk whatever the values
+    path = str(tmp_path / 'd.csv')
+    with open(path, 'w') as f:
+        f.write(header.replace('int8,integer', 'int16,smallint') + '# [DATA]\n'
+                '2010-01-01T00:00:00,1.0,5,5,1.0\n'
+                '2010-01-01T01:00:00,2.0,6,7,1.0\n'
+                '2010-01-01T02:00:00,3.0,1000,700,1.0\n')
+    chunks = list(nead.iter_chunks(path, chunksize=2, index_col=0, dtype='compact'))
+    assert([c['RH'].dtype for c in chunks] == [np.int16, np.int16])
+    assert([c['VW'].dtype for c in chunks] == [np.int16, np.int16])
+
+def test_iter_chunks():
+    ds = nead.read(fname, index_col=0, MKS=True)
+    chunks = list(nead.iter_chunks(fname, chunksize=2, index_col=0, MKS=True))
+    assert([c.sizes['timestamp'] for c in chunks] == [2, 1])
+    assert(chunks[1]['RH'].scale_factor == 0.01)
+    assert(np.allclose(np.concatenate([c['TA'].values for c in chunks]), ds['TA'].values))
+
+def test_iter_chunks_pandas():
+    chunks = list(nead.iter_chunks(fname, chunksize=2, MKS=True, output='pandas'))
+    assert(len(chunks) == 2)
+    assert(chunks[0].attrs['station_id'] == 'test_station')
+    assert(chunks[0].attrs['fields']['RH']['scale_factor'] == 0.01)
+
+def test_read_output():
+    ds = nead.read(fname, index_col=0, MKS=True)
+    df = nead.read(fname, index_col=0, MKS=True, output='pandas')
+    assert(df.index.name == 'timestamp' and list(df.columns) == ['TA', 'RH', 'VW', 'ISWR'])
+    assert(np.allclose(df['TA'].values, ds['TA'].values))
+    assert(df.attrs['station_id'] == 'test_station')
+    assert(df.attrs['fields']['RH']['scale_factor'] == 0.01)
+    arrs = nead.read(fname, index_col=0, output='numpy', variables=['RH'])
+    assert(list(arrs.keys()) == ['timestamp', 'RH'])
+    assert(arrs['timestamp'].dtype == np.dtype('datetime64[ns]'))
+    assert(np.all(arrs['RH'] == nead.read(fname)['RH'].values))
+    chunk = next(nead.iter_chunks(fname, chunksize=2, output='numpy'))
+    assert(len(chunk['TA']) == 2)
+
+def test_read_chunks():
+    pytest.importorskip('dask')
+    ds = nead.read(fname, index_col=0, MKS=True)
+    lazy = nead.read(fname, index_col=0, MKS=True, chunks=40)
+    assert(lazy['TA'].chunks is not None)
+    assert(lazy['RH'].scale_factor == 0.01)
+    assert(np.allclose(lazy['TA'].values, ds['TA'].values))
+    sel = lazy.sel(timestamp=slice('2010-06-22T13:00', None)).compute()
+    assert(np.allclose(sel['TA'].values, [276.15, 275.95]))
+
+def test_read_chunks_indexed(tmp_path, monkeypatch):
+    pytest.importorskip('dask')
+    import xarray as xr
+    path = str(tmp_path / 'hourly.csv')
+    df = make_nead(path)
+    df.loc[::7, 'TA'] = -999
+    nead.write(df, 'sample_header.ini', path)
+    nead.build_index(path, every=100)
+
+    # the sidecar index gives the blocks, dtypes and timestamps; nothing is scanned
+    def scan(*args):
+        raise AssertionError('data section scanned')
+    monkeypatch.setattr(nead.nead, '_block_ranges', scan)
+    for kw in [dict(), dict(index_col=0), dict(index_col=0, MKS=True, utc=True)]:
+        ds = nead.read(path, **kw)
+        lazy = nead.read(path, chunks=3000, **kw)
+        assert(lazy['TA'].chunks is not None and len(lazy['TA'].chunks[0]) > 1)
+        assert({n: v.dtype for n, v in lazy.variables.items()} ==
+               {n: v.dtype for n, v in ds.variables.items()})
+        xr.testing.assert_identical(lazy.compute(), ds)
+
+def test_read_variables():
+    ds = nead.read(fname, index_col=0, MKS=True, variables=['RH', 'TA'])
+    assert(list(ds.data_vars) == ['TA', 'RH'])
+    assert(ds['RH'].scale_factor == 0.01)
+    assert(ds['TA'].add_value == 273.15)
+    assert(np.all(ds['TA'].values == [275.15, 276.15, 275.95]))
+    with pytest.raises(AssertionError):
+        nead.read(fname, variables=['XX'])
+
+def make_nead(path, rows=1000):
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2010-01-01', periods=rows, freq='h').strftime('%Y-%m-%dT%H:%M:%S'),
+        'TA': np.round(np.linspace(-10, 10, rows), 2),
+        'RH': np.arange(rows) % 100,
+        'VW': np.ones(rows),
+        'ISWR': np.zeros(rows)})
+    nead.write(df, nead_header = 'sample_header.ini', output_path = path)
+    return df
+
+def test_time_slice(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path)
+    idx = nead.build_index(path, every=10)
+    assert(len(idx['offsets']) == 100)
+    full = nead.read(path, index_col=0).sel(timestamp=slice('2010-01-10', '2010-01-11T05:00'))
+    ds = nead.read(path, index_col=0, time_slice=('2010-01-10', '2010-01-11T05:00'))
+    assert(ds.sizes['timestamp'] == 30)
+    assert(np.all(ds['timestamp'].values == full['timestamp'].values))
+    assert(np.allclose(ds['TA'].values, full['TA'].values))
+    assert(idx['sorted'])
+
+    # a row out of order between checkpoints
+    df = make_nead(path)
+    df.loc[15, 'timestamp'] = '2010-01-20T01:00:00'
+    nead.write(df, 'sample_header.ini', path)
+    assert(not nead.build_index(path, every=10)['sorted'])
+    ds = nead.read(path, index_col=0, time_slice=('2010-01-20', '2010-01-20T02:00'))
+    assert(ds.sizes['timestamp'] == 4)
+
+def test_index_invalidated(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=20)
+    nead.build_index(path, every=5)
+    assert(nead.nead._load_index(path) is not None)
+    with open(path, 'a') as f:
+        f.write('2010-01-01T20:00:00,1.0,1,1.0,1.0\n')
+    assert(nead.nead._load_index(path) is None)
+    ds = nead.read(path, index_col=0, time_slice=('2010-01-01T19:00', None))
+    assert(ds.sizes['timestamp'] == 2)
+
+def test_time_parsing(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=48)
+    with open(path, 'rb') as f:
+        hdr = nead.nead._parse_header(f)
+        assert(nead.nead._time_format(f, hdr.delimiter, 0) == '%Y-%m-%dT%H:%M:%S')
+    ds = nead.read(path, index_col=0)
+    assert(ds['timestamp'].dtype == np.dtype('datetime64[ns]'))
+    assert(ds['timestamp'].values[0] == np.datetime64('2010-01-01T00:00'))
+    # sample_header.ini has timezone = +01
+    ds = nead.read(path, index_col=0, utc=True)
+    assert(ds['timestamp'].values[0] == np.datetime64('2009-12-31T23:00'))
+    assert(ds['timestamp'].attrs['timezone'] == 'UTC')
+    ds = nead.read(path, index_col=0, utc=True, time_slice=('2010-01-01T05:00', '2010-01-01T07:00'))
+    assert(ds['timestamp'].values[0] == np.datetime64('2010-01-01T05:00'))
+    assert(ds.sizes['timestamp'] == 3)
+    chunk = next(nead.iter_chunks(path, chunksize=10, index_col=0, utc=True))
+    assert(chunk['timestamp'].values[0] == np.datetime64('2009-12-31T23:00'))
+    for tz, hours in [(1, 1), ('+01:00', 1), ('UTC', 0), ('GMT-5', -5), (5.5, 5.5)]:
+        assert(nead.nead._utc_offset(tz) == np.timedelta64(int(hours * 3600), 's'))
+    t = nead.nead._parse_times(np.array(['2010-01-01T01:00:00+01:00'] * 3, dtype=object))
+    assert(np.all(t == np.datetime64('2010-01-01T00:00', 'ns')))
+
+def test_profile(tmp_path, caplog):
+    import json, logging
+    path = str(tmp_path / 'a.csv')
+    assert(nead.nead._stage('parse') is nead.nead._NO_STAGE)
+    with caplog.at_level(logging.INFO, logger='nead'):
+        with nead.profile(memory=True, logger=logging.getLogger('nead')) as p:
+            make_nead(path, rows=50)
+            nead.read(path, index_col=0, MKS=True)
+    assert(nead.nead._stage('parse') is nead.nead._NO_STAGE)
+    stages = [r['stage'] for r in p.stages]
+    assert(stages == ['write_header', 'write_rows', 'header', 'parse', 'times',
+                      'mask_and_scale', 'build'])
+    parse = p.stages[3]
+    assert(parse['rows'] == 50 and parse['file'] == path)
+    assert(parse['bytes'] == p.stages[1]['bytes'])
+    assert(all(r['memory'] >= 0 and r['seconds'] >= 0 for r in p.stages))
+    assert(p.totals().loc['parse', 'rows'] == 50)
+    assert([json.loads(r.getMessage())['stage'] for r in caplog.records] == stages)
+    assert(caplog.records[3].nead == parse)
+
+def test_resample(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=1000)
+    with open(path, 'a') as f:
+        f.write('2010-02-11T16:00:00,-999,-999,1.0,1.0\n')
+    ds = nead.read(path, index_col=0, MKS=True)
+    r = ds.resample(timestamp='1D')
+    out = nead.read(path, index_col=0, MKS=True, resample='1D', how=['mean', 'min', 'count'])
+    assert(np.all(out['timestamp'].values == r.mean()['timestamp'].values))
+    assert(np.allclose(out['TA_mean'].values, r.mean()['TA'].values, equal_nan=True))
+    assert(np.allclose(out['RH_min'].values, r.min()['RH'].values, equal_nan=True))
+    assert(np.all(out['TA_count'].values == r.count()['TA'].values))
+    assert(out['TA_mean'].attrs['cell_methods'] == 'timestamp: mean')
+
+    # streamed in small chunks, and as a drop-in for .resample().mean()
+    out = nead.nead._read_resampled(path, '1D', 'mean', MKS=True, index_col=0, chunksize=7)
+    assert(list(out.data_vars) == list(ds.data_vars))
+    assert(np.allclose(out['TA'].values, r.mean()['TA'].values, equal_nan=True))
+    df = nead.read(path, index_col=0, resample='MS', how='max', output='pandas')
+    assert(list(df.index) == [pd.Timestamp('2010-01-01'), pd.Timestamp('2010-02-01')])
+    assert(df['TA'].iloc[-1] == 10)
+
+def test_tail(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=5)
+    tail = nead.NeadTail(path, index_col=0, MKS=True)
+    assert(tail.poll().sizes['timestamp'] == 5)
+    assert(tail.poll().sizes['timestamp'] == 0)
+    with open(path, 'a') as f:
+        f.write('2010-01-01T05:00:00,1.0,50,1.0,1.0\n2010-01-01T06:00:00,2.0,')
+    ds = tail.poll()
+    assert(ds.sizes['timestamp'] == 1)
+    assert(ds['RH'].values[0] == 0.5)
+    with open(path, 'a') as f:
+        f.write('60,1.0,1.0\n')
+    ds = tail.poll()
+    assert(ds['TA'].values[0] == 275.15)
+
+    # from_end starts before a partially written last line
+    with open(path, 'a') as f:
+        f.write('2010-01-01T07:00:00,3.0,')
+    tail = nead.NeadTail(path, index_col=0, from_end=True)
+    assert(tail.offset == os.path.getsize(path) - len('2010-01-01T07:00:00,3.0,'))
+    with open(path, 'a') as f:
+        f.write('70,1.0,1.0\n')
+    assert(tail.poll()['TA'].values.tolist() == [3.0])
+
+def test_read_new_rows(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=5)
+    ds, offset = nead.read_new_rows(path, index_col=0)
+    assert(ds.sizes['timestamp'] == 5)
+    with open(path, 'a') as f:
+        f.write('2010-01-01T05:00:00,1.0,50,1.0,1.0\n')
+    ds, offset2 = nead.read_new_rows(path, offset, index_col=0)
+    assert(ds.sizes['timestamp'] == 1 and offset2 > offset)
+
+def test_write_precision(tmp_path):
+    df = make_nead(str(tmp_path / 'a.csv'), rows=3)
+    df['TA'] = [1.23456, 2.5, np.nan]
+    path = str(tmp_path / 'b.csv')
+    nead.write(df, 'sample_header.ini', path, precision={'TA': 3}, float_format=None)
+    lines = open(path).read().split('[DATA]\n')[1].splitlines()
+    assert(lines[0].split(',')[1:3] == ['1.235', '0'])
+    assert(lines[2].split(',')[1] == '')
+    assert(lines[0].split(',')[3] == '1.0')
+
+def test_write_stream(tmp_path):
+    path = str(tmp_path / 'a.csv')
+    make_nead(path, rows=10)
+    chunks = (c.reset_index() for c in nead.iter_chunks(path, chunksize=4, output='pandas'))
+    out = str(tmp_path / 'b.csv')
+    nead.write(chunks, 'sample_header.ini', out, chunksize=2)
+    ds = nead.read(out, index_col=0)
+    assert(ds.sizes['timestamp'] == 10)
+    assert(np.allclose(ds['TA'].values, nead.read(path, index_col=0)['TA'].values))
+
+def test_write_delimiter(tmp_path):
+    df = make_nead(str(tmp_path / 'a.csv'), rows=5)
+    conf = nead.read_header('sample_header.ini')
+    conf['METADATA']['field_delimiter'] = ';'
+    conf['FIELDS']['fields'] = conf['FIELDS']['fields'].replace(',', ';')
+    for key in ['add_value', 'scale_factor']:
+        conf['FIELDS'][key] = conf['FIELDS'][key].replace(',', ';')
+    path = str(tmp_path / 'b.csv')
+    nead.write(df, conf, path)
+    lines = open(path).read().split('[DATA]\n')[1].splitlines()
+    assert(lines[0].count(';') == 4 and ',' not in lines[0])
+    ds = nead.read(path, index_col=0, MKS=True)
+    assert(np.allclose(ds['TA'].values, nead.read(str(tmp_path / 'a.csv'), index_col=0, MKS=True)['TA'].values))
+
+@pytest.mark.parametrize('suffix,module', [('.gz', 'gzip'),
+                                           ('.bz2', 'bz2'),
+                                           ('.zst', 'zstandard')])
+def test_compressed(tmp_path, monkeypatch, suffix, module):
+    import xarray as xr
+    pytest.importorskip(module)
+    monkeypatch.setattr(nead.nead, '_ZSTD_FRAME_SIZE', 4096)
+    text = str(tmp_path / 'hourly.csv')
+    df = make_nead(text)
+    path = text + suffix
+    nead.write(df, 'sample_header.ini', path)
+    assert(open(path, 'rb').read(6) != b'# NEAD')
+    assert(nead.validate(path) == [])
+    for kw in [dict(index_col=0, MKS=True),
+               dict(index_col=0, time_slice=('2010-01-10', '2010-01-12')),
+               dict(index_col=0, chunks=2000)]:
+        xr.testing.assert_identical(nead.read(path, **kw).compute(), nead.read(text, **kw).compute())
+    assert(sum(len(c) for c in nead.iter_chunks(path, chunksize=300, output='pandas')) == 1000)
+    assert(nead.read(io.BytesIO(open(path, 'rb').read()))['TA'].values[-1] == 10)
+
+    if suffix == '.zst':
+        # independent frames of whole lines, and a seek table
+        with open(path, 'rb') as f:
+            compressed, decompressed = nead.nead._zstd_seek_table(f)
+        assert(len(decompressed) > 10)
+        raw = open(text, 'rb').read()
+        assert(decompressed[-1] == len(raw))
+        assert(all(raw[o - 1:o] == b'\n' for o in decompressed[1:]))
+    # the format is detected on the handle that reads the file
+    calls = []
+    read_header_bytes = nead.nead._read_header_bytes
+    monkeypatch.setattr(nead.nead, '_read_header_bytes', lambda f: calls.append(f) or read_header_bytes(f))
+    nead.read(path, index_col=0)
+    assert(len(calls) == 1)
+
+    if suffix == '.gz':
+        # appending a gzip member grows the decompressed file
+        tail = nead.NeadTail(path, from_end=True)
+        with gzip.open(path, 'ab') as f:
+            f.write(b'2010-02-11T16:00:00,1.0,50,1.0,1.0\n')
+        assert(tail.poll().sizes['index'] == 1)
+
+@pytest.mark.parametrize('suffix,module', [('.parquet', 'pyarrow'),
+                                           ('.feather', 'pyarrow'),
+                                           ('.nc', 'scipy')])
+def test_write_binary(tmp_path, suffix, module):
+    pytest.importorskip(module)
+    ds = nead.read(fname, index_col=0, MKS=True)
+    df = nead.read(fname, index_col=0).to_dataframe().reset_index()
+    path = str(tmp_path / ('sample' + suffix))
+    nead.write(df, nead_header = 'sample_header.ini', output_path = path)
+    assert(nead.nead._file_format(path) != 'nead')
+
+    ds2 = nead.read(path, index_col=0, MKS=True)
+    assert(ds2.attrs == ds.attrs)
+    assert(ds2['RH'].scale_factor == 0.01)
+    assert(np.allclose(ds2['TA'].values, ds['TA'].values))
+    assert(np.all(ds2['timestamp'].values == ds['timestamp'].values))
+    assert(list(nead.read(path, variables=['VW']).data_vars) == ['VW'])
+    if suffix == '.nc':
+        # Readers that apply CF attributes leave the values unchanged
+        import xarray as xr
+        with xr.open_dataset(path) as plain:
+            assert(np.array_equal(plain['RH'].values, df['RH'].values))
+            assert(plain['RH'].attrs['nead_scale_factor'] == '0.01')
+
+    # a frame as read, with the timestamps still text
+    path = str(tmp_path / ('text' + suffix))
+    nead.write(nead.read(fname, output='pandas'), nead_header = 'sample_header.ini', output_path = path)
+    ds2 = nead.read(path, index_col=0, MKS=True)
+    assert(np.all(ds2['timestamp'].values == ds['timestamp'].values))
+    assert(np.allclose(ds2['RH'].values, ds['RH'].values))
+
+def test_write_nead_binary(tmp_path):
+    text = str(tmp_path / 'a.csv')
+    df = make_nead(text, rows=100)
+    df.loc[::10, 'TA'] = -999
+    df.loc[::20, 'RH'] = -999
+    nead.write(df, 'sample_header.ini', text)
+    path = str(tmp_path / 'a.bin')
+    nead.write(df, 'sample_header.ini', path, format='nead-binary')
+    assert(open(path, 'rb').readline() == b'# NEAD 1.0 UTF-8\n')
+    assert(nead.nead._file_format(path) == 'nead-binary')
+
+    ds = nead.read(text, index_col=0, MKS=True)
+    ds2 = nead.read(path, index_col=0, MKS=True)
+    assert(ds2.attrs == ds.attrs)
+    assert(ds2['RH'].attrs['database_fields_data_types'] == 'float64')
+    for v in ds.data_vars:
+        assert(np.allclose(ds2[v].values, ds[v].values, equal_nan=True))
+    assert(np.all(ds2['timestamp'].values == ds['timestamp'].values))
+
+    # Without MKS the fields are views of the file
+    ds2 = nead.read(path, index_col=0, variables=['VW'])
+    assert(isinstance(ds2['VW'].variable._data, np.memmap))
+    assert(ds2['VW'].variable._data.offset % 64 == 0)
+    ds2 = nead.read(path, index_col=0, time_slice=('2010-01-02', '2010-01-02T05:00'))
+    assert(ds2.sizes['timestamp'] == 6)
+
+def make_station(path, start, station_id='test_station', latitude='46.5', rows=10):
+    df = make_nead(path, rows=rows)
+    df['timestamp'] = pd.date_range(start, periods=rows, freq='h').strftime('%Y-%m-%dT%H:%M:%S')
+    conf = nead.read_header('sample_header.ini')
+    conf['METADATA']['station_id'] = station_id
+    conf['METADATA']['latitude'] = latitude
+    nead.write(df, conf, path)
+
+def test_open_mfdataset(tmp_path):
+    make_station(str(tmp_path / 'a_2011.csv'), '2011-01-01')
+    make_station(str(tmp_path / 'a_2010.csv'), '2010-01-01')
+    make_station(str(tmp_path / 'b_2010.csv'), '2010-01-01', 'other', '70', rows=5)
+    ds = nead.open_mfdataset(str(tmp_path / 'a_*.csv'), index_col=0, MKS=True, max_workers=2)
+    assert(ds.sizes['timestamp'] == 20)
+    assert(ds['timestamp'].to_index().is_monotonic_increasing)
+    assert(ds['RH'].scale_factor == 0.01)
+
+    ds = nead.open_mfdataset(str(tmp_path / '*.csv'), combine='station', index_col=0,
+                             parallel=False)
+    assert(list(ds['station'].values) == ['test_station', 'other'])
+    assert(list(ds['latitude'].values) == [46.5, 70])
+    assert(ds['TA'].shape == (2, 20))
+    assert(ds.attrs['nodata'] == -999)
+
+def test_open_mfdataset_mismatch(tmp_path):
+    make_station(str(tmp_path / 'a.csv'), '2010-01-01')
+    conf = nead.read_header('sample_header.ini')
+    conf['FIELDS']['fields'] = 'timestamp, TA, RH, VW, SWR'
+    df = pd.read_csv(fname, comment='#', names=['timestamp','TA','RH','VW','SWR'])
+    nead.write(df, conf, str(tmp_path / 'c.csv'))
+    with pytest.raises(ValueError, match='do not match'):
+        nead.open_mfdataset([str(tmp_path / 'a.csv'), str(tmp_path / 'c.csv')])
+
+@pytest.mark.parametrize('engine', nead.ENGINES)
+def test_engine_conformance(tmp_path, engine):
+    if engine != 'c': pytest.importorskip(engine)
+    import xarray as xr
+    path = str(tmp_path / 'large.csv')
+    df = make_nead(path, rows=5000)
+    df.loc[::7, 'TA'] = -999
+    df.loc[::11, 'RH'] = -999
+    nead.write(df, 'sample_header.ini', path)
+    for f in [fname, path]:
+        for kw in [dict(), dict(index_col=0, MKS=True), dict(variables=['RH', 'VW']),
+                   dict(index_col=0, dtype={'TA': 'float32'}), dict(index_col=0, utc=True)]:
+            xr.testing.assert_identical(nead.read(f, engine=engine, **kw),
+                                        nead.read(f, engine='c', **kw))
+    pytest.importorskip('dask')
+    for kw in [dict(chunks=1000), dict(index_col=0, chunks=1000)]:
+        xr.testing.assert_identical(nead.read(path, engine=engine, **kw).compute(),
+                                    nead.read(path, engine='c', **kw).compute())
+
+    # rows whose selected fields are all nodata or empty, and blank lines
+    holes = str(tmp_path / 'holes.csv')
+    with open(fname) as f:
+        header = f.read().split('# [DATA]\n')[0] + '# [DATA]\n'
+    with open(holes, 'w') as f:
+        f.write(header + '2010-06-22T12:00:00,2.0,52,1.2,320\n\n'
+                '2010-06-22T13:00:00,-999,60,2.4,340\n,,,,\n'
+                '2010-06-22T14:00:00,2.8,56,2.0,330\n')
+    for kw in [dict(), dict(variables=['TA']), dict(variables=['TA', 'RH'])]:
+        ds = nead.read(holes, engine=engine, **kw)
+        assert(ds.sizes['index'] == 4)
+        xr.testing.assert_identical(ds, nead.read(holes, engine='c', **kw))
+
+    # no rows: an empty data section and a time slice before the first row
+    empty = str(tmp_path / 'empty.csv')
+    with open(fname) as f:
+        header = f.read().split('# [DATA]\n')[0] + '# [DATA]\n'
+    with open(empty, 'w') as f:
+        f.write(header)
+    for f, kw in [(empty, dict()), (empty, dict(index_col=0)),
+                  (path, dict(index_col=0, time_slice=('2000-01-01', '2000-01-02')))]:
+        xr.testing.assert_identical(nead.read(f, engine=engine, **kw),
+                                    nead.read(f, engine='c', **kw))
+
+def test_scan(tmp_path):
+    import shutil
+    import sqlite3
+    make_nead(str(tmp_path / 'hourly.csv'))
+    sample = str(tmp_path / 'sample.csv')
+    shutil.copy(fname, sample)
+    (tmp_path / 'broken.csv').write_text('not a NEAD file\n')
+    catalog = str(tmp_path / 'catalog.sqlite')
+    cat = nead.scan(str(tmp_path / '*.csv'), catalog=catalog).set_index('path')
+    assert(len(cat) == 3)
+    assert(cat.loc[sample, 'time_start'] == pd.Timestamp('2010-06-22T12:00:00'))
+    assert(cat.loc[sample, 'time_end'] == pd.Timestamp('2010-06-22T14:00:00'))
+    assert(cat.loc[sample, 'rows'] == 3 and cat.loc[sample, 'rows_exact'])
+    assert(cat.loc[sample, 'fields'] == ['timestamp', 'TA', 'RH', 'VW', 'ISWR'])
+    assert(cat.loc[sample, 'station_id'] == 'test_station')
+    assert(cat['error'].notna().sum() == 1)
+    assert(abs(cat['rows'].max() - 1000) < 50)
+
+    # only changed files are read again; deleted files are pruned
+    with open(sample, 'a') as f:
+        f.write('2010-06-22T15:00:00,   2.0,  52,  1.2,  320.\n')
+    os.remove(str(tmp_path / 'broken.csv'))
+    cat = nead.scan(str(tmp_path / '*.csv'), catalog=catalog).set_index('path')
+    assert(len(cat) == 2)
+    assert(cat.loc[sample, 'time_end'] == pd.Timestamp('2010-06-22T15:00:00'))
+    with contextlib.closing(sqlite3.connect(catalog)) as db:
+        assert(db.execute('SELECT COUNT(*) FROM files').fetchone()[0] == 2)
+        assert(db.execute("SELECT COUNT(DISTINCT path) FROM fields WHERE name = 'TA'").fetchone()[0] == 2)
+
+def test_split_concat(tmp_path):
+    path = str(tmp_path / 'hourly.csv')
+    make_nead(path, rows=2000)
+    raw = open(path, 'rb').read()
+    parts = nead.split(path, by='month')
+    assert(list(parts.keys()) == ['2010-01', '2010-02', '2010-03'])
+    assert(parts['2010-02'] == str(tmp_path / 'hourly_2010-02.csv'))
+    ds = nead.read(parts['2010-02'], index_col=0)
+    assert(ds.sizes['timestamp'] == 28 * 24)
+    assert(str(ds['timestamp'].values[0])[:10] == '2010-02-01')
+
+    # concat restores the original bytes, in time order by default
+    out = str(tmp_path / 'joined.csv')
+    order = nead.concat(list(reversed(parts.values())), out)
+    assert(order == list(parts.values()))
+    assert(open(out, 'rb').read() == raw)
+
+    # data lines are copied as text, including padding and a missing newline
+    lines = raw.split(b'[DATA]\n')
+    odd = lines[0] + b'[DATA]\n' + b'  2009-12-31T23:00:00,  1.005,  50,1,1\n\n2011-01-01T00:00:00,1,2,3,4'
+    (tmp_path / 'odd.csv').write_bytes(odd)
+    parts = nead.split(str(tmp_path / 'odd.csv'), output_path=str(tmp_path / 'y{key}.csv.gz'))
+    assert(list(parts.keys()) == ['2009', '2011'])
+    assert(gzip.open(parts['2009']).read().endswith(b'  1.005,  50,1,1\n'))
+    assert(gzip.open(parts['2011']).read().endswith(b'1,2,3,4\n'))
+
+    conf = nead.read_header('sample_header.ini')
+    conf['METADATA']['nodata'] = '-9999'
+    other = str(tmp_path / 'other.csv')
+    nead.write(nead.read(path, output='pandas').reset_index(drop=True), conf, other)
+    with pytest.raises(ValueError):
+        nead.concat([path, other], str(tmp_path / 'bad.csv'))
+
+def test_async(tmp_path):
+    import asyncio
+    import xarray as xr
+    paths = [str(tmp_path / ('s%d.csv' % i)) for i in range(5)]
+
+    async def run():
+        ds = await nead.aread(fname, index_col=0, MKS=True)
+        xr.testing.assert_identical(ds, nead.read(fname, index_col=0, MKS=True))
+        df = nead.read(fname, index_col=0).to_dataframe().reset_index()
+        for p in paths:
+            await nead.awrite(df, 'sample_header.ini', p)
+        done = [p async for p, ds in nead.aread_many(paths, limit=2, index_col=0)]
+        assert(sorted(done) == paths)
+        failed = [r async for r in nead.aread_many([paths[0], str(tmp_path / 'missing.csv')],
+                                                   return_exceptions=True)]
+        assert(sorted(type(r).__name__ for p, r in failed) == ['Dataset', 'FileNotFoundError'])
+    asyncio.run(run())
+    assert(np.all(nead.read(paths[0])['TA'].values == nead.read(fname)['TA'].values))
+
+    # binary NEAD is memory-mapped by read(), not loaded into memory first
+    binary = str(tmp_path / 'a.bin')
+    nead.write(nead.read(fname, output='pandas'), 'sample_header.ini', binary, format='nead-binary')
+    assert(nead.nead._read_text_file(binary) is None)
+    assert(nead.nead._read_text_file(fname) == open(fname, 'rb').read())
+    ds = asyncio.run(nead.aread(binary, index_col=0))
+    assert(isinstance(ds['VW'].variable._data, np.memmap))
+
+def test_validate(tmp_path):
+    assert(nead.validate(fname) == [])
+    lines = open(fname).read().splitlines(keepends=True)
+    bad = tmp_path / 'bad.csv'
+    bad.write_text(''.join(lines[:-1] + [lines[-1].rstrip('\n') + ',1\n']))
+    problems = nead.validate(str(bad))
+    assert(len(problems) >= 1)
+    assert(('line %d' % len(lines)) in problems[0])
+
+def test_cli(tmp_path, capsys):
+    from nead import cli
+    out = str(tmp_path / 'out')
+    argv = ['convert', fname, '-o', out, '-t', 'nead-binary', '-j', '1']
+    assert(cli.main(argv) == 0)
+    assert('converted 1, skipped 0' in capsys.readouterr().out)
+    assert(cli.main(argv) == 0)
+    assert('converted 0, skipped 1' in capsys.readouterr().out)
+    binary = str(tmp_path / 'out' / 'sample.nead')
+    assert(np.all(nead.read(binary)['TA'].values == nead.read(fname)['TA'].values))
+
+    assert(cli.main(['info', '--json', binary]) == 0)
+    assert('"rows": 3' in capsys.readouterr().out)
+    assert(cli.main(['validate', binary, fname, '-j', '1']) == 0)
+    assert(cli.main(['validate', str(tmp_path / 'missing.csv'), '-j', '1']) == 1)
+
 def test_print():
     ds = nead.read(fname, index_col=0)
     print(ds)